@@ -0,0 +1,425 @@
+# Course:       CS261 - Data Structures
+# Author:       Derek Hand
+# Assignment:   Portfolio Project
+# Description:  A reproducible benchmark suite for both graph classes on seeded random, grid, power-law and complete
+#               graphs, with JSON results and regression checks against a stored baseline, plus a timing comparison
+#               of the DirectedGraph storage backends on dense random graphs
+
+import argparse
+import gc
+import json
+import math
+import platform
+import random
+import sys
+import time
+
+from d_graph import DirectedGraph, np
+from ud_graph import UndirectedGraph
+
+SIZES = (10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+FAMILIES = ('random', 'grid', 'power_law', 'complete')
+COMPLETE_MAX = 2000     # a complete graph has n(n - 1) / 2 edges, so larger ones are skipped
+BATCH = 1000            # how many calls the mutation operations make per timed run
+MIN_TIME = 0.1          # seconds each measurement keeps running the operation for, as timeit's autorange() does
+BUILD_BUDGET = 5        # ... unless building the graphs has taken this many times as long, for graphs slow to build
+RETIME_ROUNDS = 3       # how many more times a possible regression is timed before it is reported
+
+
+def random_dense_edges(n: int, density: float, seed: int) -> []:
+    """
+    Description:    Builds a seeded random edge list where each ordered pair is an edge with the given probability
+    Input(s):       n:          the number of vertices
+                    density:    the probability of each edge
+                    seed:       the random seed
+    Output(s):      edges:      [(src, dst, weight)]
+    """
+
+    rng = random.Random(seed)
+    return [(u, v, rng.randint(1, 20)) for u in range(n) for v in range(n) if u != v and rng.random() < density]
+
+
+def random_edges(n: int, seed: int, degree: int = 4) -> []:
+    """
+    Description:    Builds a seeded uniformly random edge list with about the given average degree and no loops
+    Input(s):       n:          the number of vertices
+                    seed:       the random seed
+                    degree:     the average number of edges per vertex
+    Output(s):      edges:      [(u, v)] with vertex ids in range(n)
+    """
+
+    rng = random.Random(seed)
+    edges = []
+    while len(edges) < n * degree // 2:
+        u, v = rng.randrange(n), rng.randrange(n)
+        if u != v:
+            edges.append((u, v))
+    return edges
+
+
+def grid_edges(n: int) -> []:
+    """
+    Description:    Builds a square grid of about n vertices, each joined to its right and lower neighbors
+    Input(s):       n:          the number of vertices, rounded down to a square
+    Output(s):      edges:      [(u, v)] with u < v
+    """
+
+    side = math.isqrt(n)
+    edges = []
+    for row in range(side):
+        for col in range(side):
+            u = row * side + col
+            if col + 1 < side:
+                edges.append((u, u + 1))
+            if row + 1 < side:
+                edges.append((u, u + side))
+    return edges
+
+
+def power_law_edges(n: int, seed: int, m: int = 2) -> []:
+    """
+    Description:    Builds a seeded scale-free graph by preferential attachment (Barabasi-Albert): each new vertex
+                    links to m earlier vertices picked in proportion to their degree, which gives a few large hubs
+    Input(s):       n:          the number of vertices
+                    seed:       the random seed
+                    m:          the number of edges each new vertex brings
+    Output(s):      edges:      [(u, v)] with u < v, so directed edges point from older to newer vertices
+    """
+
+    rng = random.Random(seed)
+    edges = []
+    endpoints = list(range(m))      # every vertex appears here once per incident edge
+    for u in range(m, n):
+        targets = set()
+        while len(targets) < m:
+            targets.add(rng.choice(endpoints))
+        for v in targets:
+            edges.append((v, u))
+            endpoints.extend((u, v))
+    return edges
+
+
+def complete_edges(n: int) -> []:
+    """
+    Description:    Builds the edges of the complete graph on n vertices
+    Input(s):       n:          the number of vertices
+    Output(s):      edges:      [(u, v)] with u < v
+    """
+
+    return [(u, v) for u in range(n) for v in range(u + 1, n)]
+
+
+def family_edges(family: str, n: int, seed: int) -> []:
+    """
+    Description:    Builds the edge list of a graph family by name
+    Input(s):       family:     one of FAMILIES
+                    n:          the number of vertices
+                    seed:       the random seed, unused by the deterministic families
+    Output(s):      edges:      [(u, v)]
+    """
+
+    if family == 'random':
+        return random_edges(n, seed)
+    if family == 'grid':
+        return grid_edges(n)
+    if family == 'power_law':
+        return power_law_edges(n, seed)
+    if family == 'complete':
+        return complete_edges(n)
+    raise ValueError(f'unknown graph family {family!r}, expected one of {FAMILIES}')
+
+
+def time_call(func, repeat: int = 3) -> (float, object):
+    """
+    Description:    Times a call, keeping the best of several runs
+    Input(s):       func:       a function taking no arguments
+                    repeat:     how many times to run it
+    Output(s):      (seconds, result of the last call)
+    """
+
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def time_fresh(build, op, repeat: int = 3, min_time: float = MIN_TIME) -> float:
+    """
+    Description:    Times an operation on a freshly built graph each run, so mutations and lazily built indexes
+                    do not carry over between runs. Like timeit's autorange(), each measurement keeps running the
+                    operation on new graphs until it has been timed for at least min_time, so a fast operation is
+                    judged on its best of many runs rather than on one run that an interruption can slow down.
+                    Building is not timed, but a measurement also stops once BUILD_BUDGET times min_time has passed
+                    in all. Garbage collection is paused while timing as timeit does
+    Input(s):       build:      a function returning a new graph
+                    op:         a function taking the graph
+                    repeat:     how many measurements to keep the best of
+                    min_time:   the least total time in seconds each measurement runs the operation for
+    Output(s):      seconds:    the best time of one run
+    """
+
+    best = float('inf')
+    for _ in range(repeat):
+        total = 0.0
+        runs = 0
+        began = time.perf_counter()
+        while runs == 0 or total < min_time and time.perf_counter() - began < BUILD_BUDGET * min_time:
+            graph = build()
+            gc.collect()
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                op(graph)
+                seconds = time.perf_counter() - start
+            finally:
+                gc.enable()
+            total += seconds
+            runs += 1
+            best = min(best, seconds)
+    return best
+
+
+def suite_operations(n: int, seed: int) -> dict:
+    """
+    Description:    Returns the benchmarked operations of each graph class. Mutations make BATCH calls per run on
+                    seeded vertices, and traversals start from vertex 0
+    Input(s):       n:          the number of vertices
+                    seed:       the random seed
+    Output(s):      {class name: {operation name: function taking the graph}}
+    """
+
+    rng = random.Random(seed + 1)
+    pairs = [(rng.randrange(n), rng.randrange(n)) for _ in range(BATCH)]
+    victims = [rng.randrange(n) for _ in range(min(BATCH, n))]
+    names = [(str(u), str(v)) for u, v in pairs]
+    weighted = [(u, v, rng.randint(1, 20)) for u, v in pairs]
+
+    def add_names(graph):
+        for u, v in names:
+            graph.add_edge(u, v)
+
+    def remove_names(graph):
+        for v in victims:
+            graph.remove_vertex(str(v))
+
+    def add_weighted(graph):
+        for u, v, weight in weighted:
+            graph.add_edge(u, v, weight)
+
+    return {
+        'UndirectedGraph': {
+            'add_edge': add_names,
+            'remove_vertex': remove_names,
+            'get_edges': lambda g: g.get_edges(),
+            'dfs': lambda g: g.dfs('0'),
+            'bfs': lambda g: g.bfs('0'),
+            'count_connected_components': lambda g: g.count_connected_components(),
+            'has_cycle': lambda g: g.has_cycle(),
+        },
+        'DirectedGraph': {
+            'add_edge': add_weighted,
+            'get_edges': lambda g: g.get_edges(),
+            'dfs': lambda g: g.dfs(0),
+            'bfs': lambda g: g.bfs(0),
+            'has_cycle': lambda g: g.has_cycle(),
+            'dijkstra': lambda g: g.dijkstra(0),
+        },
+    }
+
+
+def graph_builders(family: str, n: int, seed: int, storage: str) -> ([], dict):
+    """
+    Description:    Builds the edge list of a graph family once, and functions that build a new graph of each class
+                    from it, the DirectedGraph with seeded weights
+    Input(s):       family:     one of FAMILIES
+                    n:          the number of vertices
+                    seed:       the random seed
+                    storage:    the DirectedGraph backend
+    Output(s):      (edges, {class name: function returning a new graph})
+    """
+
+    edges = family_edges(family, n, seed)
+    rng = random.Random(seed)
+    weights = [rng.randint(1, 20) for _ in edges]
+    builders = {
+        'UndirectedGraph': lambda: UndirectedGraph.from_edges((str(u), str(v)) for u, v in edges),
+        'DirectedGraph': lambda: DirectedGraph.from_edges(
+            ((u, v, weight) for (u, v), weight in zip(edges, weights)), storage, n),
+    }
+    return edges, builders
+
+
+def retime(report: dict, regressions: []) -> None:
+    """
+    Description:    Times the results of a run_suite() report that were flagged as regressions once more, keeping
+                    the faster time. A busy machine can slow a whole measurement down, but such a burst passes, so
+                    a real slowdown is the one that shows up in every timing
+    Input(s):       report:         a run_suite() result, updated in place
+                    regressions:    the compare_to_baseline() result for it
+    Output(s):      None
+    """
+
+    def key(record):
+        return record['graph'], record['family'], record['n'], record['op']
+
+    config = report['config']
+    flagged = {key(regression) for regression in regressions}
+    for record in report['results']:
+        if key(record) not in flagged:
+            continue
+        _, builders = graph_builders(record['family'], record['n'], config['seed'], config['storage'])
+        op = suite_operations(record['n'], config['seed'])[record['graph']][record['op']]
+        seconds = time_fresh(builders[record['graph']], op, config['repeat'], config['min_time'])
+        record['seconds'] = min(record['seconds'], seconds)
+
+
+def run_suite(sizes=SIZES, families=FAMILIES, seed: int = 0, repeat: int = 3, storage: str = 'sparse',
+              min_time: float = MIN_TIME) -> dict:
+    """
+    Description:    Times every operation of both graph classes on every graph family and size. DirectedGraph has
+                    no remove_vertex() or count_connected_components(), so those only run on UndirectedGraph
+    Input(s):       sizes:      the vertex counts to run
+                    families:   the graph families to run
+                    seed:       the random seed of the graphs and the operations
+                    repeat:     how many measurements to keep the best of
+                    storage:    the DirectedGraph backend
+                    min_time:   the least total time in seconds each measurement runs an operation for
+    Output(s):      a JSON-ready dict of the environment and one result record per measurement
+    """
+
+    results = []
+    for family in families:
+        for n in sizes:
+            if family == 'complete' and n > COMPLETE_MAX:
+                continue
+
+            edges, builders = graph_builders(family, n, seed, storage)
+            for graph, operations in suite_operations(n, seed).items():
+                for op, func in operations.items():
+                    seconds = time_fresh(builders[graph], func, repeat, min_time)
+                    results.append({'graph': graph, 'family': family, 'n': n, 'edges': len(edges), 'op': op,
+                                    'seconds': seconds})
+                    print(f'{graph:<16} {family:<10} n={n:<8} {op:<27} {seconds * 1000:10.2f} ms', flush=True)
+
+    return {
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'numpy': None if np is None else np.__version__},
+        'config': {'sizes': list(sizes), 'families': list(families), 'seed': seed, 'repeat': repeat,
+                   'storage': storage, 'batch': BATCH, 'min_time': min_time},
+        'results': results,
+    }
+
+
+def compare_to_baseline(report: dict, baseline: dict, tolerance: float = 0.25, min_delta: float = 0.0005) -> []:
+    """
+    Description:    Finds the measurements that got slower than the baseline by more than the tolerance and by more
+                    than min_delta seconds, so jitter on operations that take microseconds is not reported. Results
+                    are matched on graph class, family, size and operation, and ones missing from either side are
+                    ignored
+    Input(s):       report:     a run_suite() result
+                    baseline:   an earlier run_suite() result
+                    tolerance:  the allowed slowdown, 0.25 means 25% slower
+                    min_delta:  the allowed slowdown in seconds whatever the ratio
+    Output(s):      regressions: [{graph, family, n, op, baseline, seconds, ratio}], worst first
+    """
+
+    def key(record):
+        return record['graph'], record['family'], record['n'], record['op']
+
+    before = {key(record): record['seconds'] for record in baseline['results']}
+    regressions = []
+    for record in report['results']:
+        old = before.get(key(record))
+        if old is None or old <= 0:
+            continue
+        if record['seconds'] > old * (1 + tolerance) and record['seconds'] - old > min_delta:
+            regressions.append({**{name: record[name] for name in ('graph', 'family', 'n', 'op')},
+                                'baseline': old, 'seconds': record['seconds'], 'ratio': record['seconds'] / old})
+
+    return sorted(regressions, key=lambda regression: -regression['ratio'])
+
+
+def compare_dense_engines(n: int, density: float = 0.3, seed: int = 0) -> None:
+    """
+    Description:    Times the pure Python matrix against the NumPy engine on the same graph, checking that both
+                    return identical results
+    Input(s):       n:          the number of vertices
+                    density:    the probability of each edge
+                    seed:       the random seed
+    Output(s):      None, prints one line per operation
+    """
+
+    edges = random_dense_edges(n, density, seed)
+    graphs = {kind: DirectedGraph(edges, storage=kind) for kind in ('dense', 'numpy')}
+    path = graphs['dense'].dfs(0)[:50]
+
+    operations = {
+        'get_edges': lambda g: g.get_edges(),
+        'is_valid_path': lambda g: g.is_valid_path(path),
+        'bfs': lambda g: g.bfs(0),
+        'dfs': lambda g: g.dfs(0),
+        'dijkstra': lambda g: g.dijkstra(0),
+    }
+
+    print(f'n={n} edges={len(edges)}')
+    for name, op in operations.items():
+        python_time, python_result = time_call(lambda: op(graphs['dense']))
+        numpy_time, numpy_result = time_call(lambda: op(graphs['numpy']))
+        assert python_result == numpy_result, name
+        print(f'  {name:<14} python {python_time * 1000:9.2f} ms   numpy {numpy_time * 1000:9.2f} ms'
+              f'   x{python_time / numpy_time:6.1f}')
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark the graph classes')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10 ** 2, 10 ** 3, 10 ** 4],
+                        help=f'vertex counts to run, up to {SIZES[-1]}')
+    parser.add_argument('--families', nargs='+', choices=FAMILIES, default=list(FAMILIES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--storage', default='sparse', help='the DirectedGraph backend')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='a JSON file from an earlier run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown against the baseline')
+    parser.add_argument('--min-delta', type=float, default=0.0005,
+                        help='allowed slowdown in seconds against the baseline, whatever the ratio')
+    parser.add_argument('--min-time', type=float, default=MIN_TIME,
+                        help='least total seconds each measurement runs an operation for')
+    parser.add_argument('--engines', action='store_true', help='compare the dense storage engines instead')
+    args = parser.parse_args()
+
+    if args.engines:
+        if np is None:
+            print('numpy is not installed, nothing to compare')
+        else:
+            for n in (100, 300, 1000):
+                compare_dense_engines(n)
+        sys.exit()
+
+    report = run_suite(args.sizes, args.families, args.seed, args.repeat, args.storage, args.min_time)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare_to_baseline(report, baseline, args.tolerance, args.min_delta)
+        for _ in range(RETIME_ROUNDS):
+            if not regressions:
+                break
+            print(f'timing {len(regressions)} possible regressions again', flush=True)
+            retime(report, regressions)
+            regressions = compare_to_baseline(report, baseline, args.tolerance, args.min_delta)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        for regression in regressions:
+            print(f"REGRESSION {regression['graph']} {regression['family']} n={regression['n']} {regression['op']}:"
+                  f" {regression['baseline'] * 1000:.2f} ms -> {regression['seconds'] * 1000:.2f} ms"
+                  f" (x{regression['ratio']:.2f})")
+        sys.exit(1 if regressions else 0)
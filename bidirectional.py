@@ -0,0 +1,65 @@
+# Course:       CS261 - Data Structures
+# Author:       Derek Hand
+# Assignment:   Portfolio Project
+# Description:  Bidirectional breadth first search for point to point fewest-edge paths, shared by both graph classes
+
+
+def bidirectional_bfs(src, dst, forward, backward) -> []:
+    """
+    Description:    Finds a path with the fewest edges from src to dst by growing a breadth first search from each end
+                    and stopping where they meet. Each round expands a whole level of whichever frontier is smaller,
+                    so on low diameter graphs both searches stay around the square root of the size of a one-sided
+                    search. Every meeting point found in the first level where the searches touch lies on a shortest
+                    path, so the first one is used
+    Input(s):       src:        the start vertex
+                    dst:        the end vertex
+                    forward:    a function returning the vertices reachable from a vertex in one step
+                    backward:   a function returning the vertices that reach a vertex in one step
+    Output(s):      path:       the vertices from src to dst, or an empty list if dst cannot be reached
+    """
+
+    if src == dst:
+        return [src]
+
+    parents = ({src: None}, {dst: None})
+    frontiers = [[src], [dst]]
+    steps = (forward, backward)
+
+    while frontiers[0] and frontiers[1]:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        seen, other, step = parents[side], parents[1 - side], steps[side]
+
+        level = []
+        for v in frontiers[side]:
+            for w in step(v):
+                if w not in seen:
+                    seen[w] = v
+                    if w in other:
+                        return _join(w, parents[0], parents[1])
+                    level.append(w)
+        frontiers[side] = level
+
+    return []
+
+
+def _join(meet, forward_parents: dict, backward_parents: dict) -> []:
+    """
+    Description:    Joins the two halves of a bidirectional search at the vertex where they met
+    Input(s):       meet:               the vertex reached by both searches
+                    forward_parents:    each vertex's parent in the search from the start
+                    backward_parents:   each vertex's parent in the search from the end
+    Output(s):      path:               the vertices from the start to the end
+    """
+
+    path = []
+    v = meet
+    while v is not None:
+        path.append(v)
+        v = forward_parents[v]
+    path.reverse()
+
+    v = backward_parents[meet]
+    while v is not None:
+        path.append(v)
+        v = backward_parents[v]
+    return path
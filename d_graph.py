@@ -3,38 +3,543 @@
 # Assignment:   Portfolio Project Part 2: Directed Graph via Adjacency Matrix
 # Description:  An implementation of a directed graph via an adjacency matrix
 
-class DirectedGraph:
+import os
+from array import array
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heappop, heappush
+from itertools import chain
+from threading import RLock
+
+from bidirectional import bidirectional_bfs
+from edge_batch import edge_batch
+from edge_files import iter_edge_rows, iter_numeric_blocks
+from graph_format import read_graph_file, write_graph_file
+from graph_controls import GraphControls, locked
+from instrumentation import add_count, counted_calls, counted_items
+from path_validation import edge_lookup, flatten_paths, validate_flat
+from query_cache import cached_query
+
+try:
+    import numpy as np
+except ImportError:     # numpy is optional, only NumpyStorage needs it
+    np = None
+
+
+class DenseStorage:
+    """
+    Class to store a directed graph as a dense adjacency matrix
+    - a list of rows of weights, 0 meaning no edge
+    - O(V^2) memory and O(1) edge lookups, best for small or dense graphs
+    """
+
+    kind = 'dense'
+
+    def __init__(self, n=0):
+        self.n = n
+        self.rows = [[0] * n for _ in range(n)]
+
+    def add_vertices(self, k: int) -> None:
+        """
+        Description:    Adds k vertices, growing each row in place so existing edges are kept
+        Input(s):       k:  the number of vertices to add
+        Output(s):      None
+        """
+
+        padding = [0] * k
+        for row in self.rows:
+            row.extend(padding)
+
+        self.n += k
+        for _ in range(k):
+            self.rows.append([0] * self.n)
+
+    def fork(self):
+        """
+        Description:    Returns a copy to modify while snapshots keep reading this storage. The rows are copied
+                        outright, dense storage is meant for small graphs
+        Input(s):       None
+        Output(s):      a DenseStorage
+        """
+
+        copy = DenseStorage()
+        copy.n = self.n
+        copy.rows = [row[:] for row in self.rows]
+        return copy
+
+    def get(self, src: int, dst: int):
+        return self.rows[src][dst]
+
+    def set(self, src: int, dst: int, weight) -> None:
+        self.rows[src][dst] = weight
+
+    def set_many(self, srcs, dsts, weights) -> None:
+        rows = self.rows
+        for src, dst, weight in zip(srcs, dsts, weights):
+            rows[src][dst] = weight
+
+    def neighbors(self, v: int) -> []:
+        """
+        Description:    Returns the destinations of v's outgoing edges in ascending order
+        Input(s):       v:          the source vertex
+        Output(s):      neighbors:  a list of vertex indices
+        """
+
+        return [i for i, weight in enumerate(self.rows[v]) if weight != 0]
+
+    def weighted_neighbors(self, v: int):
+        return [(i, weight) for i, weight in enumerate(self.rows[v]) if weight != 0]
+
+    def predecessors(self, v: int) -> []:
+        """
+        Description:    Returns the sources of v's incoming edges in ascending order, scanning column v
+        Input(s):       v:              the destination vertex
+        Output(s):      predecessors:   a list of vertex indices
+        """
+
+        return [i for i, row in enumerate(self.rows) if row[v] != 0]
+
+    def is_path(self, path) -> bool:
+        rows = self.rows
+        return all(rows[path[i]][path[i + 1]] != 0 for i in range(len(path) - 1))
+
+    def row(self, v: int) -> []:
+        return self.rows[v]
+
+    def edges(self):
+        """
+        Description:    Yields every edge as (src, dst, weight), ordered by src and then dst
+        Input(s):       None
+        Output(s):      yields edge tuples
+        """
+
+        for i, row in enumerate(self.rows):
+            for j, weight in enumerate(row):
+                if weight != 0:
+                    yield (i, j, weight)
+
+
+class SparseStorage:
+    """
+    Class to store a directed graph as one dict of {dst: weight} per vertex
+    - a set of sources per vertex mirrors the edges for backward searches
+    - O(V + E) memory and O(1) average edge lookups, inserts and deletes
+    - suited to large mutable graphs with few edges per vertex
+    - a fork() shares every vertex's dict and set with the storage it came from, copying each one on its first change
+    """
+
+    kind = 'sparse'
+
+    def __init__(self, n=0):
+        self.n = n
+        self.out = [dict() for _ in range(n)]
+        self.into = [set() for _ in range(n)]
+        self.owned = None   # after a fork(), the vertices whose dict and set have been copied since
+
+    def fork(self):
+        """
+        Description:    Returns a copy to modify while snapshots keep reading this storage. Only the lists of dicts
+                        and sets are copied, O(V), and each vertex's own are copied when the copy first changes them
+        Input(s):       None
+        Output(s):      a SparseStorage
+        """
+
+        copy = SparseStorage()
+        copy.n = self.n
+        copy.out = list(self.out)
+        copy.into = list(self.into)
+        copy.owned = (set(), set())
+        return copy
+
+    @classmethod
+    def from_csr(cls, csr):
+        """
+        Description:    Thaws compressed sparse rows, building each vertex's dict from its slice of the arrays in one
+                        call rather than setting its edges one at a time
+        Input(s):       csr:    a CSRStorage
+        Output(s):      a SparseStorage
+        """
+
+        storage = cls(csr.n)
+        offsets, targets, weights = csr.offsets, csr.targets, csr.weights
+        into = storage.into
+        for src in range(csr.n):
+            lo, hi = offsets[src], offsets[src + 1]
+            if lo == hi:
+                continue
+            row = storage.out[src] = dict(zip(targets[lo:hi].tolist(), weights[lo:hi].tolist()))
+            for dst in row:
+                into[dst].add(src)
+        return storage
+
+    def _own(self, src: int, dst: int) -> None:
+        """
+        Description:    Copies src's outgoing dict and dst's incoming set if they are still shared after a fork()
+        Input(s):       src:    the source of the edge about to change
+                        dst:    the destination of the edge about to change
+        Output(s):      None
+        """
+
+        owned_out, owned_into = self.owned
+        if src not in owned_out:
+            self.out[src] = dict(self.out[src])
+            owned_out.add(src)
+        if dst not in owned_into:
+            self.into[dst] = set(self.into[dst])
+            owned_into.add(dst)
+
+    def add_vertices(self, k: int) -> None:
+        self.n += k
+        self.out.extend(dict() for _ in range(k))
+        self.into.extend(set() for _ in range(k))
+
+    def get(self, src: int, dst: int):
+        return self.out[src].get(dst, 0)
+
+    def set(self, src: int, dst: int, weight) -> None:
+        if self.owned is not None:
+            self._own(src, dst)
+        if weight != 0:
+            self.out[src][dst] = weight
+            self.into[dst].add(src)
+        else:
+            self.out[src].pop(dst, None)
+            self.into[dst].discard(src)
+
+    def set_many(self, srcs, dsts, weights) -> None:
+        for src, dst, weight in zip(srcs, dsts, weights):
+            self.set(src, dst, weight)
+
+    def neighbors(self, v: int) -> []:
+        return sorted(self.out[v])
+
+    def weighted_neighbors(self, v: int):
+        return self.out[v].items()
+
+    def predecessors(self, v: int) -> []:
+        return sorted(self.into[v])
+
+    def is_path(self, path) -> bool:
+        out = self.out
+        return all(path[i + 1] in out[path[i]] for i in range(len(path) - 1))
+
+    def row(self, v: int) -> []:
+        row = [0] * self.n
+        for dst, weight in self.out[v].items():
+            row[dst] = weight
+        return row
+
+    def edges(self):
+        for i, out in enumerate(self.out):
+            for j in sorted(out):
+                yield (i, j, out[j])
+
+
+class CSRStorage:
+    """
+    Class to store a frozen directed graph in compressed sparse row form
+    - the destinations of vertex v are targets[offsets[v]:offsets[v + 1]], sorted, with matching weights
+    - flat typed arrays, so O(V + E) memory with no per-vertex objects
+    - the reverse (incoming edge) arrays are built on the first backward query
+    - the arrays may be memoryviews into a memory mapped file, then source is that file's path
+    - read only, the graph converts it back to SparseStorage on the first mutation
+    """
+
+    kind = 'csr'
+
+    def __init__(self, offsets, targets, weights, source=None):
+        self.n = len(offsets) - 1
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.source = source
+        self.reverse = None
+
+    @classmethod
+    def from_edges(cls, n: int, edges):
+        """
+        Description:    Builds the arrays from an edge iterable in a single pass
+        Input(s):       n:      the number of vertices
+                        edges:  (src, dst, weight) tuples, ordered by src and then dst
+        Output(s):      a CSRStorage
+        """
+
+        offsets = array('q', bytes(8 * (n + 1)))
+        targets = array('i')
+        values = []
+
+        row = 0
+        for src, dst, weight in edges:
+            while row < src:
+                row += 1
+                offsets[row] = len(targets)
+            targets.append(dst)
+            values.append(weight)
+
+        while row < n:
+            row += 1
+            offsets[row] = len(targets)
+
+        if all(type(weight) is int for weight in values):
+            weights = array('q', values)
+        else:
+            weights = array('d', values)
+
+        return cls(offsets, targets, weights)
+
+    def fork(self):
+        return self     # read only, so it can be shared as it is
+
+    def get(self, src: int, dst: int):
+        lo, hi = self.offsets[src], self.offsets[src + 1]
+        k = bisect_left(self.targets, dst, lo, hi)
+        if k < hi and self.targets[k] == dst:
+            return self.weights[k]
+        return 0
+
+    def neighbors(self, v: int) -> []:
+        return self.targets[self.offsets[v]:self.offsets[v + 1]].tolist()
+
+    def weighted_neighbors(self, v: int):
+        lo, hi = self.offsets[v], self.offsets[v + 1]
+        return zip(self.targets[lo:hi], self.weights[lo:hi])
+
+    def predecessors(self, v: int) -> []:
+        if self.reverse is None:
+            self.reverse = self._transpose()
+        offsets, sources = self.reverse
+        return sources[offsets[v]:offsets[v + 1]].tolist()
+
+    def _transpose(self):
+        """
+        Description:    Builds the incoming edge arrays with a counting sort over the targets
+        Input(s):       None
+        Output(s):      (offsets, sources) where the sources of v's incoming edges are sources[offsets[v]:offsets[v + 1]]
+        """
+
+        offsets = array('q', bytes(8 * (self.n + 1)))
+        for dst in self.targets:
+            offsets[dst + 1] += 1
+        for v in range(self.n):
+            offsets[v + 1] += offsets[v]
+
+        sources = array('i', bytes(4 * len(self.targets)))
+        cursor = offsets[:-1]
+        for src in range(self.n):
+            for k in range(self.offsets[src], self.offsets[src + 1]):
+                dst = self.targets[k]
+                sources[cursor[dst]] = src
+                cursor[dst] += 1
+
+        return offsets, sources
+
+    def is_path(self, path) -> bool:
+        return all(self.get(path[i], path[i + 1]) != 0 for i in range(len(path) - 1))
+
+    def row(self, v: int) -> []:
+        row = [0] * self.n
+        for dst, weight in self.weighted_neighbors(v):
+            row[dst] = weight
+        return row
+
+    def edges(self):
+        offsets, targets, weights = self.offsets, self.targets, self.weights
+        for i in range(self.n):
+            for k in range(offsets[i], offsets[i + 1]):
+                yield (i, targets[k], weights[k])
+
+
+class NumpyStorage:
+    """
+    Class to store a directed graph as a dense NumPy adjacency matrix
+    - the array reserves capacity geometrically, only the top-left n x n block is in use
+    - row scans, edge extraction and path checks run as vectorized operations
+    - weights are int64, setting a float weight converts the whole matrix to float64
+    - requires numpy
+    """
+
+    kind = 'numpy'
+
+    def __init__(self, n=0):
+        if np is None:
+            raise ImportError("the 'numpy' storage requires numpy to be installed")
+
+        self.n = n
+        self.matrix = np.zeros((n, n), dtype=np.int64)
+
+    def add_vertices(self, k: int) -> None:
+        """
+        Description:    Adds k vertices, doubling the reserved capacity when it runs out so growth is amortized
+                        O(V) per vertex
+        Input(s):       k:  the number of vertices to add
+        Output(s):      None
+        """
+
+        n = self.n + k
+        capacity = self.matrix.shape[0]
+        if n > capacity:
+            grown = np.zeros((max(2 * capacity, n), max(2 * capacity, n)), dtype=self.matrix.dtype)
+            grown[:self.n, :self.n] = self.matrix[:self.n, :self.n]
+            self.matrix = grown
+        self.n = n
+
+    def fork(self):
+        """
+        Description:    Returns a copy to modify while snapshots keep reading this storage, copying the matrix
+        Input(s):       None
+        Output(s):      a NumpyStorage
+        """
+
+        copy = NumpyStorage()
+        copy.n = self.n
+        copy.matrix = self.matrix.copy()
+        return copy
+
+    def get(self, src: int, dst: int):
+        return self.matrix[src, dst].item()
+
+    def set(self, src: int, dst: int, weight) -> None:
+        if isinstance(weight, float) and self.matrix.dtype.kind != 'f':
+            self.matrix = self.matrix.astype(np.float64)
+        self.matrix[src, dst] = weight
+
+    def set_many(self, srcs, dsts, weights) -> None:
+        """
+        Description:    Sets many weights with one vectorized assignment. Each (src, dst) pair must appear only once
+        Input(s):       srcs:       the source of each edge
+                        dsts:       the destination of each edge
+                        weights:    the weight of each edge, 0 to remove it
+        Output(s):      None
+        """
+
+        weights = np.asarray(weights)
+        if weights.dtype.kind == 'f' and self.matrix.dtype.kind != 'f':
+            self.matrix = self.matrix.astype(np.float64)
+        self.matrix[np.asarray(srcs, dtype=np.intp), np.asarray(dsts, dtype=np.intp)] = weights
+
+    def neighbors(self, v: int) -> []:
+        return np.flatnonzero(self.matrix[v, :self.n]).tolist()
+
+    def weighted_neighbors(self, v: int):
+        row = self.matrix[v, :self.n]
+        dsts = np.flatnonzero(row)
+        return zip(dsts.tolist(), row[dsts].tolist())
+
+    def predecessors(self, v: int) -> []:
+        return np.flatnonzero(self.matrix[:self.n, v]).tolist()
+
+    def is_path(self, path) -> bool:
+        path = np.asarray(path, dtype=np.intp)
+        return bool(np.all(self.matrix[path[:-1], path[1:]] != 0))
+
+    def row(self, v: int) -> []:
+        return self.matrix[v, :self.n].tolist()
+
+    def edges(self):
+        block = self.matrix[:self.n, :self.n]
+        srcs, dsts = np.nonzero(block)
+        return zip(srcs.tolist(), dsts.tolist(), block[srcs, dsts].tolist())
+
+    def expand(self, frontier, seen):
+        """
+        Description:    Expands one breadth first search level at once. Each newly reached vertex is credited to the
+                        first frontier vertex that reaches it, and the result is in the order a queue based search
+                        would produce
+        Input(s):       frontier:   an integer array of the current level, in visit order
+                        seen:       a boolean array of visited vertices, updated in place
+        Output(s):      (vertices, parents) integer arrays for the next level
+        """
+
+        reach = (self.matrix[frontier, :self.n] != 0) & ~seen
+        found = np.flatnonzero(reach.any(axis=0))
+        owner = reach[:, found].argmax(axis=0)
+        order = np.lexsort((found, owner))
+        seen[found] = True
+        return found[order], frontier[owner[order]]
+
+    def dijkstra(self, src: int):
+        """
+        Description:    Dense Dijkstra with the minimum search and the relaxation of each row vectorized
+        Input(s):       src:    the source vertex
+        Output(s):      a float array of distances, inf where unreachable
+        """
+
+        block = self.matrix[:self.n, :self.n]
+        distances = np.full(self.n, np.inf)
+        settled = np.zeros(self.n, dtype=bool)
+        distances[src] = 0
+
+        for _ in range(self.n):
+            u = int(np.argmin(np.where(settled, np.inf, distances)))
+            if settled[u] or distances[u] == np.inf:
+                break
+            settled[u] = True
+
+            row = block[u]
+            candidates = distances[u] + row
+            better = (row != 0) & (candidates < distances)
+            distances[better] = candidates[better]
+
+        return distances
+
+
+STORAGE_KINDS = {'dense': DenseStorage, 'sparse': SparseStorage, 'csr': CSRStorage, 'numpy': NumpyStorage}
+
+# the methods enable_instrumentation() records
+INSTRUMENTED_METHODS = ('set_storage', 'freeze', 'add_vertex', 'add_vertices', 'add_edge', 'add_edges', 'remove_edge',
+                        'remove_edges', 'get_vertices', 'get_edges', 'is_valid_path', 'validate_paths', 'dfs', 'bfs',
+                        'shortest_hop_path', 'has_cycle', 'topological_order', 'dijkstra', 'dijkstra_paths',
+                        'shortest_path', 'bfs_many', 'dijkstra_many', 'all_pairs_shortest_paths', 'snapshot',
+                        'save')
+
+
+class DirectedGraph(GraphControls):
     """
     Class to implement directed weighted graph
     - duplicate edges not allowed
     - loops not allowed
     - only positive edge weights
     - vertex names are integers
+    - stored as a dense adjacency matrix by default, or in another backend (see STORAGE_KINDS)
+    - keeps a topological order while the graph is acyclic, with strict_dag=True edges that would close a cycle
+      are ignored
     """
 
-    def __init__(self, start_edges=None):
+    instrumented_methods = INSTRUMENTED_METHODS
+
+    def __init__(self, start_edges=None, storage='dense', strict_dag=False):
         """
-        Store graph info as adjacency matrix
-        DO NOT CHANGE THIS METHOD IN ANY WAY
+        Store graph info as adjacency matrix, or in the backend named by storage ('dense', 'sparse', 'csr' or
+        'numpy'). _version counts mutations so cached query results can be told apart from stale ones. _order and
+        _position hold a topological order and each vertex's place in it, both None when the graph has a cycle
+        (_cyclic True) or when it may have stopped having one (_cyclic None). _shared is set while snapshots share
+        the storage and the order, so the next mutation copies them first. _counters is the dict the search loops add
+        their work to during an instrumented call, and _edge_index caches the edge lookup validate_paths() built for
+        one version and storage. _lock is held by every mutation and by snapshot()
         """
         self.v_count = 0
-        self.adj_matrix = []
+        self._version = 0
+        self._cache = None
+        self._instrumentation = None
+        self._counters = None
+        self._edge_index = None
+        self._order = []
+        self._position = []
+        self._cyclic = False
+        self._shared = False
+        self._lock = RLock()
+        self.strict_dag = strict_dag
+        self._storage = DenseStorage()
+        self.set_storage(storage)
 
         # populate graph with initial vertices and edges (if provided)
-        # before using, implement add_vertex() and add_edge() methods
         if start_edges is not None:
-            v_count = 0
-            for u, v, _ in start_edges:
-                v_count = max(v_count, u, v)
-            for _ in range(v_count + 1):
-                self.add_vertex()
-            for u, v, weight in start_edges:
-                self.add_edge(u, v, weight)
+            self._load(start_edges, 1)      # grows to the largest id as it goes, with at least one vertex
 
     def __str__(self):
         """
         Return content of the graph in human-readable form
-        DO NOT CHANGE THIS METHOD IN ANY WAY
         """
         if self.v_count == 0:
             return 'EMPTY GRAPH\n'
@@ -42,37 +547,156 @@ class DirectedGraph:
         out += ' '.join(['{:2}'.format(i) for i in range(self.v_count)]) + '\n'
         out += '-' * (self.v_count * 3 + 3) + '\n'
         for i in range(self.v_count):
-            row = self.adj_matrix[i]
+            row = self._storage.row(i)
             out += '{:2} |'.format(i)
             out += ' '.join(['{:2}'.format(w) for w in row]) + '\n'
         out = f"GRAPH ({self.v_count} vertices):\n{out}"
         return out
 
+    @property
+    def adj_matrix(self) -> []:
+        """
+        The adjacency matrix as a list of rows. With dense storage this is the live matrix, otherwise it is an
+        O(V^2) copy built on every access
+        """
+        if self._storage.kind == 'dense':
+            return self._storage.rows
+        return [self._storage.row(i) for i in range(self.v_count)]
+
+    @property
+    def storage(self) -> str:
+        """
+        The name of the current storage backend: 'dense', 'sparse', 'csr' or 'numpy'
+        """
+        return self._storage.kind
+
     # ------------------------------------------------------------------ #
 
+    @locked
+    def set_storage(self, kind: str) -> None:
+        """
+        Description:    Converts the graph to another storage backend, keeping every vertex and edge
+        Input(s):       kind:   'dense' for an adjacency matrix, 'sparse' for mutable per-vertex dicts, 'csr' for
+                                frozen compressed sparse rows, or 'numpy' for a vectorized dense matrix
+        Output(s):      None
+        """
+
+        if kind not in STORAGE_KINDS:
+            raise ValueError(f"unknown storage '{kind}', expected one of {sorted(STORAGE_KINDS)}")
+
+        if kind == self._storage.kind:
+            return
+
+        if kind == 'csr':
+            self._storage = CSRStorage.from_edges(self.v_count, self._storage.edges())
+            return
+        if kind == 'sparse' and self._storage.kind == 'csr':
+            self._storage = SparseStorage.from_csr(self._storage)
+            return
+
+        storage = STORAGE_KINDS[kind](self.v_count)
+        for src, dst, weight in self._storage.edges():
+            storage.set(src, dst, weight)
+        self._storage = storage
+
+    def freeze(self) -> None:
+        """
+        Description:    Packs the graph into compressed sparse rows for compact, fast read-only queries. Any later
+                        mutation converts it back to sparse storage first
+        Input(s):       None
+        Output(s):      None
+        """
+
+        self.set_storage('csr')
+
+    @locked
+    def snapshot(self):
+        """
+        Description:    Returns a read-only view of the graph as it is now, in O(1). The view shares the storage and
+                        the topological order, and this graph copies them on its next mutation (copy on write), so
+                        any number of threads can query the view while one thread keeps modifying the graph
+        Input(s):       None
+        Output(s):      a DirectedSnapshot, whose mutating methods raise TypeError
+        """
+
+        self._shared = True
+        view = DirectedSnapshot.__new__(DirectedSnapshot)
+        view.v_count = self.v_count
+        view._version = self._version
+        view._cache = None
+        view._instrumentation = None
+        view._counters = None
+        view._edge_index = self._edge_index
+        view._order = self._order
+        view._position = self._position
+        view._cyclic = self._cyclic
+        view._shared = False
+        view._lock = RLock()
+        view.strict_dag = self.strict_dag
+        view._storage = self._storage
+        return view
+
+    def _unshare(self) -> None:
+        """
+        Description:    Copies the storage and the topological order if snapshots share them, before they change
+        Input(s):       None
+        Output(s):      None
+        """
+
+        if self._shared:
+            self._storage = self._storage.fork()
+            if self._order is not None:
+                self._order = self._order[:]
+                self._position = self._position[:]
+            self._shared = False
+
+    def _writable(self):
+        """
+        Description:    Returns the storage, thawing frozen compressed sparse rows into sparse storage first
+        Input(s):       None
+        Output(s):      the storage backend
+        """
+
+        self._unshare()
+        if self._storage.kind == 'csr':
+            self.set_storage('sparse')
+        return self._storage
+
     def add_vertex(self) -> int:
         """
-        Description:    Adds a vertex into the adjacency matrix
+        Description:    Adds a vertex into the adjacency matrix, keeping all existing edges. Each row grows in place
+                        and Python lists over-allocate geometrically, so this is amortized O(V)
         Input(s):       None
         Output(s):      num:    the number of vertices in the graph after the vertex was added
         """
 
-        if not self.adj_matrix:
-            self.adj_matrix.append([0])
+        return self.add_vertices(1)
 
-        else:
-            self.adj_matrix[0].append(0)
-            self.adj_matrix.append([0])
-            for i in range(1, len(self.adj_matrix[0])):
-                self.adj_matrix[i] = [0] * len(self.adj_matrix[0])
+    @locked
+    def add_vertices(self, k: int) -> int:
+        """
+        Description:    Adds k vertices into the adjacency matrix at once, keeping all existing edges
+        Input(s):       k:      the number of vertices to add
+        Output(s):      num:    the number of vertices in the graph after the vertices were added
+        """
+
+        if k <= 0:
+            return self.v_count
 
-        self.v_count += 1
+        self._writable().add_vertices(k)
+        if self._order is not None:
+            self._position.extend(range(self.v_count, self.v_count + k))
+            self._order.extend(range(self.v_count, self.v_count + k))
+        self.v_count += k
+        self._version += 1
 
         return self.v_count
 
+    @locked
     def add_edge(self, src: int, dst: int, weight=1) -> None:
         """
-        Description:    Adds an edge and a weight
+        Description:    Adds an edge and a weight, updating the topological order. In strict_dag mode an edge that
+                        would close a cycle is ignored
         Input(s):       src:    The source
                         dst:    The destination
         Output(s):      None
@@ -81,11 +705,29 @@ class DirectedGraph:
         if src == dst or weight < 0:
             return
 
-        if src >= self.v_count or dst >= self.v_count:
+        if src >= self.v_count or dst >= self.v_count or src < 0 or dst < 0:
             return
 
-        self.adj_matrix[src][dst] = weight
+        if weight == 0:
+            self.remove_edge(src, dst)
+            return
 
+        if self._storage.get(src, dst) == 0:
+            if self.strict_dag and self._cyclic is not False:
+                self.has_cycle()    # recover the order if possible, so the check below is cheap
+            if self._order is not None:
+                if not self._reorder(src, dst):
+                    if self.strict_dag:
+                        return
+                    self._order = self._position = None
+                    self._cyclic = True
+            elif self.strict_dag and self._reaches(dst, src):
+                return
+
+        self._writable().set(src, dst, weight)
+        self._version += 1
+
+    @locked
     def remove_edge(self, src: int, dst: int) -> None:
         """
         Description:    Removes the edge at the given location
@@ -97,8 +739,86 @@ class DirectedGraph:
         if src == dst or src >= self.v_count or dst >= self.v_count or src < 0 or dst < 0:
             return
 
-        self.adj_matrix[src][dst] = 0
+        if self._storage.get(src, dst) == 0:
+            return
+
+        self._writable().set(src, dst, 0)
+        self._version += 1
+        if self._order is None:
+            self._cyclic = None     # the removed edge may have been on every cycle
+
+    @locked
+    def add_edges(self, edges) -> None:
+        """
+        Description:    Adds many edges at once. Invalid edges are skipped and weight 0 removes an edge as add_edge()
+                        would, and a repeated edge keeps its last weight. The storage is written in one pass and the
+                        topological order is checked once at the end: it is kept if every new edge agrees with it and
+                        otherwise rebuilt on demand. In strict_dag mode each edge still goes through add_edge(), since
+                        it has to be checked against the ones before it
+        Input(s):       edges:  an iterable of (src, dst, weight) tuples, weight 1 when left out
+        Output(s):      None
+        """
+
+        if self.strict_dag:
+            for src, dst, *weight in edges:
+                self.add_edge(src, dst, *weight)
+            return
 
+        n = self.v_count
+        latest = dict()
+        for src, dst, *weight in edges:
+            weight = weight[0] if weight else 1
+            if src != dst and 0 <= src < n and 0 <= dst < n and weight >= 0:
+                latest[src, dst] = weight
+
+        removals = [edge for edge, weight in latest.items() if weight == 0]
+        for edge in removals:
+            del latest[edge]
+
+        if latest:
+            position = self._position
+            if position is not None and any(position[src] > position[dst] for src, dst in latest):
+                self._order = self._position = None
+                self._cyclic = None
+            srcs, dsts = zip(*latest)
+            self._writable().set_many(srcs, dsts, list(latest.values()))
+            self._version += 1
+
+        self.remove_edges(removals)
+
+    @locked
+    def remove_edges(self, edges) -> None:
+        """
+        Description:    Removes many edges at once, skipping ones that do not exist, and updates the version and the
+                        cycle state once
+        Input(s):       edges:  an iterable of (src, dst) or (src, dst, weight) tuples
+        Output(s):      None
+        """
+
+        n = self.v_count
+        get = self._storage.get
+        gone = {(src, dst) for src, dst, *_ in edges if src != dst and 0 <= src < n and 0 <= dst < n}
+        gone = [edge for edge in gone if get(*edge) != 0]
+        if not gone:
+            return
+
+        srcs, dsts = zip(*gone)
+        self._writable().set_many(srcs, dsts, [0] * len(gone))
+        self._version += 1
+        if self._order is None:
+            self._cyclic = None     # a removed edge may have been on every cycle
+
+    def batch(self):
+        """
+        Description:    Returns a context manager that collects add_edge() and remove_edge() calls and applies them
+                        with add_edges() and remove_edges() when the block ends, or drops them if it raises:
+                            with graph.batch() as batch:
+                                batch.add_edge(0, 1, 5)
+        Input(s):       None
+        Output(s):      a context manager yielding an EdgeBatch
+        """
+
+        return edge_batch(self)
 
     def get_vertices(self) -> []:
         """
@@ -107,13 +827,7 @@ class DirectedGraph:
         Output(s):      a list of all vertices
         """
 
-        if not self.adj_matrix:
-            return []
-
-        vertices = []
-        for i in range(self.v_count):
-            vertices.append(i)
-        return vertices
+        return list(range(self.v_count))
 
     def get_edges(self) -> []:
         """
@@ -123,17 +837,7 @@ class DirectedGraph:
         Output(s):      edges:  [(src, dst, weight)]
         """
 
-        if not self.adj_matrix:
-            return []
-
-        edges = []
-
-        for i in range(self.v_count):
-            for j in range(self.v_count):
-                if self.adj_matrix[i][j] != 0:
-                    edges.append((i, j, self.adj_matrix[i][j]))
-
-        return edges
+        return list(self._storage.edges())
 
     def is_valid_path(self, path: []) -> bool:
         """
@@ -143,7 +847,7 @@ class DirectedGraph:
                         False:  if the given path is invalid
         """
 
-        if not self.adj_matrix:
+        if self.v_count == 0:
             return False
 
         if len(path) == 1:
@@ -152,12 +856,64 @@ class DirectedGraph:
             else:
                 return False
 
-        for i in range(len(path) - 1):
-            if self.adj_matrix[path[i]][path[i+1]] == 0:
+        for v in path:
+            if v < 0 or v >= self.v_count:
                 return False
 
-        return True
+        return self._storage.is_path(path)
+
+    def validate_paths(self, paths, pad=-1):
+        """
+        Description:    Determines which of many paths are valid, checking all of their steps in one batch. Edges are
+                        looked up with one fancy index into the matrix for the dense backends, or by binary search in
+                        sorted edge codes for the sparse ones. The lookup is built once per version of the graph, so
+                        later batches only pay for their own paths
+        Input(s):       paths:  a 2-D NumPy array of vertex ids with one path per row, each ending at its first pad
+                                entry, or an iterable of lists of vertices
+                        pad:    the padding value of a 2-D array
+        Output(s):      valid:  a boolean NumPy array with one entry per path, as is_valid_path() would return. A list
+                                of bools when numpy is not installed
+        """
+
+        if np is None:
+            return [self.is_valid_path(list(path)) for path in paths]
+
+        flat, lengths = flatten_paths(paths, pad, np.int64)
+        n = self.v_count
+        if n == 0:
+            return np.zeros(len(lengths), dtype=bool)
+
+        return validate_flat(flat, lengths, n, self._edge_lookup())
 
+    def _edge_lookup(self):
+        """
+        Description:    Returns the vectorized edge test validate_paths() uses, reusing the one built for the current
+                        version and storage
+        Input(s):       None
+        Output(s):      a function (srcs, dsts) -> boolean array of whether each pair is an edge
+        """
+
+        storage = self._storage
+        if self._edge_index is not None:
+            version, indexed, has_edge = self._edge_index
+            if version == self._version and indexed is storage:
+                return has_edge
+
+        n = self.v_count
+        if storage.kind in ('dense', 'numpy'):
+            matrix = storage.matrix[:n, :n] if storage.kind == 'numpy' else np.array(storage.rows)
+            has_edge = lambda src, dst: matrix[src, dst] != 0
+        elif storage.kind == 'csr':
+            srcs = np.repeat(np.arange(n), np.diff(np.asarray(storage.offsets)))
+            has_edge = edge_lookup(srcs, np.asarray(storage.targets), n)
+        else:
+            codes = np.fromiter(chain.from_iterable((src, dst) for src, dst, _ in storage.edges()), dtype=np.int64)
+            has_edge = edge_lookup(codes[0::2], codes[1::2], n)
+
+        self._edge_index = (self._version, storage, has_edge)
+        return has_edge
+
+    @cached_query
     def dfs(self, v_start, v_end=None) -> []:
         """
         Description:    Performs a depth first search in the graph and returns a list of the vertices visited, in the
@@ -169,42 +925,66 @@ class DirectedGraph:
 
         visited = []
 
-        if not self.adj_matrix:
-            return visited
-
-        if v_start >= self.v_count or v_start < 0:
-            return visited
-
         if v_end != None:
             if v_end >= self.v_count or v_end < 0:
                 v_end = None
 
-        self.dfs_helper(visited, v_start, v_end)
+        for vertex in self.iter_dfs(v_start):
+            visited.append(vertex)
+            if vertex == v_end:
+                break
 
         return visited
 
-    def dfs_helper(self, visited, vertex, v_end):
+    def iter_dfs(self, v_start, max_depth=None, details=False):
         """
-        Description:    A helper function to traverse the graph recursively
-        Input(s):       visited:    to keep track of what we have visited
-                        vertex:     to keep track of what vertex to check for
-                        v_end:      where do we end
-        Output(s):      None
+        Description:    Lazily yields the vertices of a depth first search in the same order as dfs(). Uses an
+                        explicit stack of neighbor iterators, and no further work is done once the caller stops consuming
+                        it. The graph must not be modified while the generator is in use
+        Input(s):       v_start:    where to start the search, nothing is yielded if it is not a valid vertex
+                        max_depth:  if provided, vertices deeper than this in the search tree are not expanded
+                        details:    if True, yields (vertex, parent, depth) tuples instead of bare vertices
+        Output(s):      yields the vertices visited, in the order that they were visited
         """
 
-        if vertex not in visited:
-            visited.append(vertex)
-            if v_end != None and vertex == v_end:
-                return True
-            if len(visited) == self.v_count:
-                return True
-
-            for i in range(self.v_count):
-                if self.adj_matrix[vertex][i] != 0:
-                    exit = self.dfs_helper(visited, i, v_end)
-                    if exit:
-                        return True
+        if v_start >= self.v_count or v_start < 0:
+            return
 
+        seen = [False] * self.v_count
+        seen[v_start] = True
+        count = 1
+        stack = []
+        push, neighbors = stack.append, self._storage.neighbors
+        counters = self._counters
+        if counters is not None:    # instrumented, count the work as it is done
+            push = counted_calls(push, counters, 'stack_pushes')
+            neighbors = counted_items(neighbors, counters, 'edges_scanned')
+
+        try:
+            yield (v_start, None, 0) if details else v_start
+
+            if max_depth is not None and max_depth <= 0:
+                return
+
+            push((v_start, iter(neighbors(v_start))))
+            while stack and count < self.v_count:
+                parent, row = stack[-1]
+                for i in row:
+                    if not seen[i]:
+                        seen[i] = True
+                        count += 1
+                        depth = len(stack)
+                        yield (i, parent, depth) if details else i
+                        if max_depth is None or depth < max_depth:
+                            push((i, iter(neighbors(i))))
+                        break
+                else:
+                    stack.pop()     # every neighbor seen, backtrack
+        finally:
+            if counters is not None:
+                add_count(counters, 'vertices_visited', count)
+
+    @cached_query
     def bfs(self, v_start, v_end=None) -> []:
         """
         Description:    Performs a breadth first search in the graph and returns a list of indices visited, in the
@@ -215,112 +995,801 @@ class DirectedGraph:
         """
 
         visited = []
-        queue = []
-
-        if v_start < 0 or v_start >= self.v_count:
-            return visited
 
         if v_end != None:
             if v_end >= self.v_count or v_end < 0:
                 v_end = None
 
-        visited.append(v_start)
-        queue.append(v_start)
+        for vertex in self.iter_bfs(v_start):
+            visited.append(vertex)
+            if vertex == v_end:
+                break
+
+        return visited
 
-        while queue:
-            next = queue.pop(0)
+    def iter_bfs(self, v_start, max_depth=None, details=False):
+        """
+        Description:    Lazily yields the vertices of a breadth first search in the same order as bfs(), so callers
+                        can stop after the first k vertices or on any condition without finishing the search. The
+                        graph must not be modified while the generator is in use
+        Input(s):       v_start:    where to start the search, nothing is yielded if it is not a valid vertex
+                        max_depth:  if provided, vertices more than this many edges from v_start are not yielded
+                        details:    if True, yields (vertex, parent, depth) tuples instead of bare vertices
+        Output(s):      yields the vertices visited, in the order that they were visited
+        """
 
-            for i in range(self.v_count):
-                if i not in visited and self.adj_matrix[next][i] != 0:
-                    visited.append(i)
-                    queue.append(i)
+        if v_start < 0 or v_start >= self.v_count:
+            return
 
-                if i == v_end:
-                    break
+        if self._storage.kind == 'numpy':
+            yield from self._iter_bfs_levels(v_start, max_depth, details)
+            return
 
-            if i == v_end:
-                break
+        seen = [False] * self.v_count
+        seen[v_start] = True
+        queue = deque()
+        push, neighbors = queue.append, self._storage.neighbors
+        counters = self._counters
+        if counters is not None:    # instrumented, count the work as it is done
+            push = counted_calls(push, counters, 'queue_pushes')
+            neighbors = counted_items(neighbors, counters, 'edges_scanned')
+
+        try:
+            yield (v_start, None, 0) if details else v_start
+
+            push((v_start, 0))
+            while queue:
+                next, depth = queue.popleft()
+                if max_depth is not None and depth >= max_depth:
+                    continue
+
+                for i in neighbors(next):
+                    if not seen[i]:
+                        seen[i] = True
+                        yield (i, next, depth + 1) if details else i
+                        push((i, depth + 1))
+        finally:
+            if counters is not None:
+                add_count(counters, 'vertices_visited', seen.count(True))
+
+    def _iter_bfs_levels(self, v_start, max_depth, details):
+        """
+        Description:    Breadth first search for NumPy storage that expands a whole level per vectorized step, yielding
+                        the same order as the queue based search
+        Input(s):       as iter_bfs()
+        Output(s):      yields the vertices visited, in the order that they were visited
+        """
 
-        return visited
+        seen = np.zeros(self.v_count, dtype=bool)
+        seen[v_start] = True
+        counters = self._counters
+        try:
+            yield (v_start, None, 0) if details else v_start
+
+            frontier = np.array([v_start])
+            depth = 0
+            while len(frontier) and (max_depth is None or depth < max_depth):
+                depth += 1
+                if counters is not None:    # instrumented, each level scans the whole rows of its frontier
+                    rows = self._storage.matrix[frontier, :self.v_count]
+                    add_count(counters, 'edges_scanned', int(np.count_nonzero(rows)))
+                frontier, parents = self._storage.expand(frontier, seen)
+                if details:
+                    for vertex, parent in zip(frontier.tolist(), parents.tolist()):
+                        yield (vertex, parent, depth)
+                else:
+                    yield from frontier.tolist()
+        finally:
+            if counters is not None:
+                add_count(counters, 'vertices_visited', int(seen.sum()))
+
+    @cached_query
+    def shortest_hop_path(self, src: int, dst: int) -> []:
+        """
+        Description:    Returns a path with the fewest edges (ignoring weights) from src to dst, searching forward from
+                        src and backward from dst over incoming edges until the two meet. On large graphs with short
+                        paths this visits far fewer vertices than bfs(src, dst)
+        Input(s):       src:    the start of the path
+                        dst:    the end of the path
+        Output(s):      path:   the vertices from src to dst, or an empty list if either is invalid or dst is
+                                unreachable
+        """
+
+        if src < 0 or dst < 0 or src >= self.v_count or dst >= self.v_count:
+            return []
+
+        return bidirectional_bfs(src, dst, self._storage.neighbors, self._storage.predecessors)
+
+    def bfs_many(self, sources):
+        """
+        Description:    Computes hop counts (ignoring weights) from many sources at once. Every source gets one bit of a
+                        per-vertex bitmask, so a single level synchronous breadth first search advances all of them
+                        together: each edge is followed once per level for all sources with one integer OR. With
+                        numpy storage each level is instead one boolean frontier matrix product with the adjacency
+                        matrix
+        Input(s):       sources:    an iterable of source vertices, all valid
+        Output(s):      distances:  a 2-D float array with one row per source, holding the number of edges on a
+                                    shortest path to each vertex (inf where unreachable). A NumPy array when numpy is
+                                    installed, otherwise a list of array('d') rows
+        """
+
+        sources = list(sources)
+        for src in sources:
+            if src < 0 or src >= self.v_count:
+                raise ValueError(f'source {src} is not a vertex of the graph')
+
+        if self._storage.kind == 'numpy':
+            return self._bfs_many_matrix(sources)
+
+        n = self.v_count
+        neighbors = self._storage.neighbors
+        adjacency = [neighbors(v) for v in range(n)]
+        seen = [0] * n
+        frontier = dict()   # vertex -> bitmask of the sources whose search reached it on this level
+        for k, src in enumerate(sources):
+            frontier[src] = frontier.get(src, 0) | (1 << k)
+        for v, mask in frontier.items():
+            seen[v] = mask
+
+        levels = []         # the frontier of each level after the first, holding only the newly reached sources
+        while frontier:
+            reached = dict()
+            for v, mask in frontier.items():
+                for w in adjacency[v]:
+                    reached[w] = reached.get(w, 0) | mask
+
+            frontier = dict()
+            for w, mask in reached.items():
+                mask &= ~seen[w]
+                if mask:
+                    seen[w] |= mask
+                    frontier[w] = mask
+            levels.append(frontier)
+
+        return self._hop_table(sources, levels)
+
+    def _hop_table(self, sources, levels) -> []:
+        """
+        Description:    Turns the per-level bitmasks of bfs_many() into a table of distances. With numpy the masks of a
+                        level are unpacked into a boolean matrix in one step instead of bit by bit
+        Input(s):       sources:    the source vertices, bit k of a mask stands for sources[k]
+                        levels:     levels[d] maps each vertex first reached d + 1 edges away to its bitmask
+        Output(s):      distances:  as bfs_many()
+        """
+
+        n = self.v_count
+        if np is None:
+            rows = [array('d', [float('inf')]) * n for _ in sources]
+            for k, src in enumerate(sources):
+                rows[k][src] = 0
+            for level, frontier in enumerate(levels, 1):
+                for w, mask in frontier.items():
+                    while mask:
+                        low = mask & -mask
+                        rows[low.bit_length() - 1][w] = level
+                        mask ^= low
+            return rows
+
+        # filled one row per vertex, then transposed to one row per source
+        distances = np.full((n, len(sources)), np.inf)
+        distances[sources, np.arange(len(sources))] = 0
+        width = (len(sources) + 7) // 8
+        for level, frontier in enumerate(levels, 1):
+            if not frontier:
+                continue
+            vertices = np.fromiter(frontier, dtype=np.intp, count=len(frontier))
+            packed = b''.join(mask.to_bytes(width, 'little') for mask in frontier.values())
+            bits = np.unpackbits(np.frombuffer(packed, dtype=np.uint8).reshape(len(frontier), width), axis=1,
+                                 count=len(sources), bitorder='little')
+            distances[vertices] = np.where(bits, level, distances[vertices])
+        return np.ascontiguousarray(distances.T)
+
+    def _bfs_many_matrix(self, sources) -> []:
+        """
+        Description:    The numpy storage version of bfs_many(): a sources x vertices boolean frontier advances one
+                        level per matrix product with the adjacency matrix
+        Input(s):       sources:    a list of valid source vertices
+        Output(s):      distances:  as bfs_many()
+        """
+
+        n = self.v_count
+        adjacency = (self._storage.matrix[:n, :n] != 0).astype(np.float32)
+        rows = np.arange(len(sources))
+        distances = np.full((len(sources), n), np.inf)
+        frontier = np.zeros((len(sources), n), dtype=bool)
+        frontier[rows, sources] = True
+        distances[rows, sources] = 0
+        seen = frontier.copy()
+
+        level = 0
+        while frontier.any():
+            level += 1
+            frontier = (frontier.astype(np.float32) @ adjacency > 0) & ~seen
+            seen |= frontier
+            distances[frontier] = level
+        return distances
 
     def has_cycle(self):
         """
-        Description:    Determines if the graph has a cycle
+        Description:    Determines if the graph has a cycle. O(1) while the topological order is maintained, otherwise
+                        one O(V + E) pass of Kahn's algorithm that also restores the order if the graph is acyclic
         Input(s):       None
         Output(s):      True:   if the graph has a cycle
                         False:  if the graph does not have a cycle
         """
 
-        if not self.adj_matrix:
-            return False
-
-        visited = [False] * self.v_count
-        recursion = [False] * self.v_count
+        if self._cyclic is None:
+            self._build_order()
+        return self._cyclic
 
-        for i in range(self.v_count):
-            if visited[i] is False:
-                if self.cycle_helper(i, visited, recursion):
-                    return True
+    def topological_order(self) -> []:
+        """
+        Description:    Returns the vertices in an order where every edge goes from an earlier vertex to a later one
+        Input(s):       None
+        Output(s):      order:  a list of all vertices, or an empty list if the graph has a cycle
+        """
 
-        return False
+        if self.has_cycle():
+            return []
+        return self._order[:]
 
-    def cycle_helper(self, vertex, visited, recursion):
+    def _build_order(self) -> None:
         """
-        Description:    Does a depth first search to determine if the given vertex has a cycle
-        Input(s):       vertex:     the current node to study
-                        visited:    a list of the visited vertices
-                        recursion:  a list of the values visited in the recursion function
-        Output(s):      True:       if cycle was found
-                        False:      if cycle was not found
+        Description:    Recomputes the topological order from scratch with Kahn's algorithm, or records that the
+                        graph has a cycle
+        Input(s):       None
+        Output(s):      None
         """
 
-        visited[vertex] = True
-        recursion[vertex] = True
+        indegree = [0] * self.v_count
+        for _, dst, _ in self._storage.edges():
+            indegree[dst] += 1
+
+        order = [v for v in range(self.v_count) if indegree[v] == 0]
+        neighbors = self._storage.neighbors
+        for v in order:     # order grows while it is walked, acting as the queue
+            for w in neighbors(v):
+                indegree[w] -= 1
+                if indegree[w] == 0:
+                    order.append(w)
+
+        if len(order) < self.v_count:
+            self._order = self._position = None
+            self._cyclic = True
+            return
+
+        position = [0] * self.v_count
+        for i, v in enumerate(order):
+            position[v] = i
+        self._order, self._position, self._cyclic = order, position, False
+
+    def _reorder(self, src: int, dst: int) -> bool:
+        """
+        Description:    Updates the topological order for a new edge src -> dst (Pearce-Kelly). Only vertices whose
+                        positions lie between dst and src are searched and moved
+        Input(s):       src:    the source of the new edge
+                        dst:    the destination of the new edge
+        Output(s):      True:   if the order was updated
+                        False:  if the edge would close a cycle, the order is left unchanged
+        """
 
-        for j in range(self.v_count):
-            if visited[j] is False and self.adj_matrix[vertex][j] != 0:
-                if self.cycle_helper(j, visited, recursion):
-                    return True
-            elif recursion[j] is True and self.adj_matrix[vertex][j] != 0:
-               return True
+        self._unshare()     # the order is moved around in place
+        position = self._position
+        lower, upper = position[dst], position[src]
+        if lower > upper:
+            return True     # src already comes first
+
+        forward = []        # reachable from dst without passing src's position
+        seen = {dst}
+        stack = [dst]
+        neighbors = self._storage.neighbors
+        while stack:
+            v = stack.pop()
+            forward.append(v)
+            for w in neighbors(v):
+                if w == src:
+                    return False
+                if w not in seen and position[w] < upper:
+                    seen.add(w)
+                    stack.append(w)
+
+        backward = []       # reaching src without passing dst's position
+        seen = {src}
+        stack = [src]
+        predecessors = self._storage.predecessors
+        while stack:
+            v = stack.pop()
+            backward.append(v)
+            for w in predecessors(v):
+                if w not in seen and position[w] > lower:
+                    seen.add(w)
+                    stack.append(w)
+
+        # everything that reaches src moves ahead of everything dst reaches, reusing the same positions
+        backward.sort(key=position.__getitem__)
+        forward.sort(key=position.__getitem__)
+        moved = backward + forward
+        slots = sorted(position[v] for v in moved)
+        for slot, v in zip(slots, moved):
+            position[v] = slot
+            self._order[slot] = v
 
-        recursion[vertex] = False
-        return False
+        return True
 
+    def _reaches(self, src: int, dst: int) -> bool:
+        """
+        Description:    Determines if there is a path from src to dst
+        Input(s):       src:    the start vertex
+                        dst:    the end vertex
+        Output(s):      True:   if dst is reachable from src
+                        False:  if it is not
+        """
 
+        for v in self.iter_dfs(src):
+            if v == dst:
+                return True
+        return False
 
-    def dijkstra(self, src: int) -> []:
+    @cached_query
+    def dijkstra(self, src: int, dst=None) -> []:
         """
-        Description:    Uses Dijkstra's algorithm to determine the shortest path from the given vertex to all other
-                        vertices
+        Description:    Uses Dijkstra's algorithm with a binary heap to determine the shortest path from the given
+                        vertex to all other vertices, in O((V + E) log V)
         Input(s):       src:    the given vertex
+                        dst:    if provided, the search stops as soon as this vertex is settled. Only distances of
+                                settled vertices (including dst) are final, the rest are upper bounds
         Output(s):      dist:   a list of distances from the given vertex to all other vertices
         """
 
-        distances = [float('inf') for _ in range(self.v_count)]     # initialize all distances to inf
-        visited = [False for _ in range(self.v_count)]          # we have not visited any node
+        if src < 0 or src >= self.v_count:
+            return []
+
+        if self._storage.kind == 'numpy' and dst is None:
+            distances = self._storage.dijkstra(src)
+            if self._counters is not None:      # instrumented, every reached vertex was settled and its row relaxed
+                reached = np.flatnonzero(distances != np.inf)
+                add_count(self._counters, 'vertices_visited', len(reached))
+                add_count(self._counters, 'edges_relaxed',
+                          int(np.count_nonzero(self._storage.matrix[reached, :self.v_count])))
+            distances = distances.tolist()
+            if self._storage.matrix.dtype.kind != 'f':
+                distances = [int(d) if d != float('inf') else d for d in distances]
+            return distances
+
+        return self._dijkstra(src, dst)[0]
+
+    @cached_query
+    def dijkstra_paths(self, src: int, dst=None) -> ([], []):
+        """
+        Description:    Runs Dijkstra's algorithm from src and also records the predecessor of every reached vertex on
+                        its shortest path
+        Input(s):       src:        the given vertex
+                        dst:        if provided, the search stops as soon as this vertex is settled
+        Output(s):      distances:  a list of distances from src, inf where unreachable
+                        previous:   a list of the vertex before each vertex on its shortest path, None for src and for
+                                    unreachable vertices
+        """
+
+        return self._dijkstra(src, dst)
+
+    def _dijkstra(self, src: int, dst=None) -> ([], []):
+        """
+        Description:    The binary heap search behind dijkstra(), dijkstra_paths() and shortest_path()
+        Input(s):       as dijkstra_paths()
+        Output(s):      as dijkstra_paths()
+        """
+
+        distances = [float('inf')] * self.v_count
+        previous = [None] * self.v_count
+
+        if src < 0 or src >= self.v_count:
+            return distances, previous
+
+        settled = [False] * self.v_count
+        distances[src] = 0      # distance from start to itself is 0
+        heap = []
+        push, weighted_neighbors = heappush, self._storage.weighted_neighbors
+        counters = self._counters
+        if counters is not None:    # instrumented, count the work as it is done
+            push = counted_calls(push, counters, 'queue_pushes')
+            weighted_neighbors = counted_items(weighted_neighbors, counters, 'edges_relaxed')
+
+        push(heap, (0, src))
+        while heap:
+            distance, u = heappop(heap)
+            if settled[u]:
+                continue        # a stale entry, u was already reached more cheaply
+            settled[u] = True
+            if u == dst:
+                break
+
+            for v, weight in weighted_neighbors(u):
+                candidate = distance + weight
+                if candidate < distances[v]:
+                    distances[v] = candidate
+                    previous[v] = u
+                    push(heap, (candidate, v))
+
+        if counters is not None:
+            add_count(counters, 'vertices_visited', settled.count(True))
+        return distances, previous
+
+    @cached_query
+    def shortest_path(self, src: int, dst: int) -> []:
+        """
+        Description:    Returns the vertices on a shortest weighted path from src to dst, stopping the search as soon as
+                        dst is settled
+        Input(s):       src:    the start of the path
+                        dst:    the end of the path
+        Output(s):      path:   the list of vertices from src to dst, or an empty list if dst is unreachable
+        """
+
+        if dst < 0 or dst >= self.v_count:
+            return []
+
+        distances, previous = self._dijkstra(src, dst)
+        if distances[dst] == float('inf'):
+            return []
+
+        path = [dst]
+        while path[-1] != src:
+            path.append(previous[path[-1]])
+        path.reverse()
+        return path
+
+    def dijkstra_many(self, sources, processes=None):
+        """
+        Description:    Runs Dijkstra's algorithm from many sources, spread across a pool of worker processes. Each
+                        worker receives one read-only compressed sparse row copy of the graph when it starts (or maps
+                        the file a memory mapped graph was loaded from), and then only chunks of source ids
+        Input(s):       sources:    an iterable of source vertices
+                        processes:  the number of worker processes, defaults to the CPU count. 1 runs in this
+                                    process
+        Output(s):      distances:  a 2-D float array with one row per source (inf where unreachable). A NumPy array
+                                    when numpy is installed, otherwise a list of array('d') rows
+        """
+
+        sources = list(sources)
+        for src in sources:
+            if src < 0 or src >= self.v_count:
+                raise ValueError(f'source {src} is not a vertex of the graph')
+
+        storage = self._storage
+        if storage.kind != 'csr':
+            storage = CSRStorage.from_edges(self.v_count, storage.edges())
+
+        if processes is None:
+            processes = os.cpu_count() or 1
+        processes = max(1, min(processes, len(sources)))
+
+        rows = dict()
+        if processes == 1:
+            rows.update(_dijkstra_chunk(sources, DirectedGraph._from_storage(storage)))
+        else:
+            size = max(1, len(sources) // (processes * 4))
+            chunks = [sources[i:i + size] for i in range(0, len(sources), size)]
+            if storage.source is not None:
+                initargs = (storage.source,)    # workers map the same file, sharing its pages
+            else:
+                initargs = (storage.offsets, storage.targets, storage.weights)
+            with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=initargs) as pool:
+                for chunk in pool.map(_dijkstra_chunk, chunks):
+                    rows.update(chunk)
+
+        if np is None:
+            return [rows[src] for src in sources]
+
+        distances = np.empty((len(sources), self.v_count))
+        for i, src in enumerate(sources):
+            distances[i] = np.frombuffer(rows[src], dtype=np.float64)
+        return distances
+
+    def all_pairs_shortest_paths(self, method='dijkstra', processes=None):
+        """
+        Description:    Computes the shortest distance between every pair of vertices
+        Input(s):       method:     'dijkstra' to run dijkstra_many() over every vertex, or 'floyd_warshall' for a
+                                    vectorized O(V^3) pass that suits small dense graphs and needs numpy
+                        processes:  the number of worker processes for 'dijkstra'
+        Output(s):      distances:  a V x V float array where distances[i][j] is the distance from i to j
+        """
+
+        if method == 'dijkstra':
+            return self.dijkstra_many(range(self.v_count), processes)
+
+        if method != 'floyd_warshall':
+            raise ValueError(f"unknown method '{method}', expected 'dijkstra' or 'floyd_warshall'")
+
+        if np is None:
+            raise ImportError("the 'floyd_warshall' method requires numpy to be installed")
+
+        distances = np.full((self.v_count, self.v_count), np.inf)
+        for src, dst, weight in self._storage.edges():
+            distances[src, dst] = weight
+        np.fill_diagonal(distances, 0)
+
+        for k in range(self.v_count):
+            np.minimum(distances, distances[:, k, None] + distances[None, k, :], out=distances)
+
+        return distances
+
+    @classmethod
+    def from_edges(cls, edges, storage='sparse', v_count=0, strict_dag=False):
+        """
+        Description:    Builds a graph from (src, dst, weight) tuples in a single pass, writing straight into sparse
+                        storage instead of going through add_edge(). Invalid edges are skipped as add_edge() would
+                        and a repeated edge keeps its last weight
+        Input(s):       edges:      an iterable of (src, dst, weight) tuples, read once
+                        storage:    the backend of the finished graph
+                        v_count:    the number of vertices to reserve up front, more are added as edges need them
+                        strict_dag: passed on to the graph, edges that would close a cycle are then skipped
+        Output(s):      a DirectedGraph
+        """
+
+        graph = cls(storage='sparse', strict_dag=strict_dag)
+        graph._load(edges, v_count)
+        graph.set_storage(storage)
+        return graph
+
+    @classmethod
+    def from_edge_file(cls, path: str, delimiter='auto', header='auto', storage='csr', chunk_size=1 << 24,
+                       strict_dag=False):
+        """
+        Description:    Builds a graph from a file with one 'src dst [weight]' edge per line, separated by commas, tabs
+                        or whitespace. A missing weight is 1. The file is streamed in chunks. With numpy each chunk is
+                        parsed in one vectorized call, only its kept edges are held on to, and the graph is assembled
+                        as compressed sparse rows with a single sort
+        Input(s):       path:       the file to read
+                        delimiter:  the field separator, None for whitespace, or 'auto' for commas, tabs or whitespace
+                        header:     True if the first line holds column names, False if it is an edge, or 'auto' to
+                                    take it as a header only when it is not numeric
+                        storage:    the backend of the finished graph, by default the compressed sparse rows it is
+                                    assembled as, which thaw into sparse storage on the first mutation
+                        chunk_size: roughly how many bytes to read per chunk
+                        strict_dag: passed on to the graph, edges that would close a cycle are then skipped
+        Output(s):      a DirectedGraph
+        """
+
+        if header not in (True, False, 'auto'):
+            raise ValueError(f"header must be True, False or 'auto', not {header!r}")
+
+        graph = cls(storage='sparse', strict_dag=strict_dag)
+        if np is not None and not strict_dag:
+            graph._load_blocks(iter_numeric_blocks(path, chunk_size, delimiter, header))
+        else:
+            rows = iter_edge_rows(path, delimiter, chunk_size, header is True)
+            graph._load(_parse_edge_rows(rows, header == 'auto'))
+        graph.set_storage(storage)
+        return graph
+
+    def _load(self, edges, v_count=0) -> None:
+        """
+        Description:    Fills an empty graph from (src, dst, weight) tuples in one pass. The topological order is
+                        rebuilt on demand afterwards rather than repaired edge by edge
+        Input(s):       edges:      an iterable of (src, dst, weight) tuples
+                        v_count:    the minimum number of vertices
+        Output(s):      None
+        """
+
+        kind = self._storage.kind
+
+        if self.strict_dag:     # every edge must be checked against the ones before it
+            self.set_storage('sparse')
+            self.add_vertices(v_count)
+            for src, dst, weight in edges:
+                if max(src, dst) >= self.v_count:
+                    self.add_vertices(max(src, dst) + 1 - self.v_count)
+                self.add_edge(src, dst, weight)
+            self.set_storage(kind)
+            return
+
+        storage = SparseStorage(v_count)
+        for src, dst, weight in edges:
+            top = max(src, dst)
+            if top >= storage.n:
+                storage.add_vertices(top + 1 - storage.n)
+            if src != dst and src >= 0 and dst >= 0 and weight >= 0:
+                storage.set(src, dst, weight)
+
+        self._storage = storage
+        self.v_count = storage.n
+        self._order = self._position = None
+        self._cyclic = None
+        self._version += 1
+        self.set_storage(kind)
+
+    def _load_blocks(self, blocks) -> None:
+        """
+        Description:    Fills an empty graph from NumPy blocks of edges as compressed sparse rows. The blocks are
+                        filtered and packed as they arrive (see _pack_blocks()), then de-duplicated (the last weight
+                        wins) with a single sort, so the peak is a few dozen bytes per kept edge plus one block
+        Input(s):       blocks: an iterable of 2-D arrays with src, dst and weight columns
+        Output(s):      None
+        """
+
+        src, dst, weight, n = _pack_blocks(blocks)
+        key = src.astype(np.int64)
+        key *= n
+        key += dst
+        order = np.argsort(key, kind='stable')
+        key = key[order]
+        last = np.ones(len(key), dtype=bool)
+        last[:-1] = key[1:] != key[:-1]
+        del key
+        order = order[last]
+        order = order[weight[order] != 0]       # a zero weight removes the edge
+        src, dst, weight = src[order], dst[order], weight[order]
+
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+        weights = array('q' if np.all(weight == np.floor(weight)) else 'd')
+        weights.frombytes(memoryview(weight.astype(np.int64 if weights.typecode == 'q' else np.float64)).cast('B'))
+        targets = array('i')
+        targets.frombytes(memoryview(dst).cast('B'))
+
+        self._storage = CSRStorage(array('q', offsets.tobytes()), targets, weights)
+        self.v_count = n
+        self._order = self._position = None
+        self._cyclic = None
+        self._version += 1
+
+    def save(self, path: str) -> None:
+        """
+        Description:    Writes the graph to a binary file as compressed sparse rows: the row offsets, the destination
+                        of every edge and its weight
+        Input(s):       path:   the file to write
+        Output(s):      None
+        """
+
+        storage = self._storage
+        if storage.kind != 'csr':
+            storage = CSRStorage.from_edges(self.v_count, storage.edges())
+
+        sections = {'offsets': storage.offsets, 'targets': storage.targets, 'weights': storage.weights}
+        for name, values in sections.items():
+            if not isinstance(values, array):
+                sections[name] = array(values.format, values.tobytes())
+        write_graph_file(path, 'D', sections)
+
+    @classmethod
+    def load(cls, path: str, mmap=True):
+        """
+        Description:    Reads a graph written by save(). With mmap the file is mapped rather than read, so the graph
+                        is queryable immediately, nothing is copied and processes loading the same file share memory.
+                        The graph is then frozen, its first mutation copies it into sparse storage
+        Input(s):       path:   the file to read
+                        mmap:   whether to map the file instead of reading it
+        Output(s):      a DirectedGraph
+        """
+
+        kind, sections = read_graph_file(path, mmap)
+        if kind != 'D':
+            raise ValueError(f'{path} does not hold a DirectedGraph')
+
+        storage = CSRStorage(sections['offsets'], sections['targets'], sections['weights'], path if mmap else None)
+        return cls._from_storage(storage)
+
+    @classmethod
+    def _from_storage(cls, storage):
+        """
+        Description:    Wraps an existing storage backend in a graph without copying it
+        Input(s):       storage:    a storage backend
+        Output(s):      a DirectedGraph
+        """
+
+        graph = cls()
+        graph._storage = storage
+        graph.v_count = storage.n
+        graph._order = graph._position = None
+        graph._cyclic = None
+        return graph
+
+
+class DirectedSnapshot(DirectedGraph):
+    """
+    Class for the read-only views returned by DirectedGraph.snapshot()
+    - answers every query of the graph it was taken from, as that graph was at the time
+    - never changes after it is taken, so threads can query it without a lock
+    - adding or removing vertices or edges raises TypeError, converting the storage is still allowed
+    - does not inherit the graph's query cache or instrumentation
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('a DirectedGraph snapshot cannot be modified')
+
+    add_vertex = add_vertices = add_edge = remove_edge = add_edges = remove_edges = batch = _writable = _read_only
+
+    def snapshot(self):
+        return self     # already immutable
+
+
+# the graph each worker process of dijkstra_many() answers queries on, set once by _init_worker()
+_worker_graph = None
+
 
-        distances[src] = 0  # distance from start to itself is 0
+def _init_worker(*snapshot) -> None:
+    """
+    Description:    Rebuilds the read-only graph snapshot inside a worker process
+    Input(s):       snapshot:   the offsets, targets and weights arrays of the graph, or the path of a file written
+                                by DirectedGraph.save() to memory map
+    Output(s):      None
+    """
+
+    global _worker_graph
+    if len(snapshot) == 1:
+        _worker_graph = DirectedGraph.load(snapshot[0])
+    else:
+        _worker_graph = DirectedGraph._from_storage(CSRStorage(*snapshot))
+
+
+def _pack_blocks(blocks):
+    """
+    Description:    Filters blocks of edges as they arrive, skipping the edges add_edge() would, and appends the rest to
+                    compact typed arrays: 16 bytes per kept edge, with no copy of the blocks held on to
+    Input(s):       blocks: an iterable of 2-D float arrays with src, dst and weight columns
+    Output(s):      (src, dst, weight, n) where src and dst are int32 arrays, weight a float64 array and n the number
+                    of vertices the ids call for
+    """
+
+    srcs, dsts, weights = array('i'), array('i'), array('d')
+    n = 0
+    for table in blocks:
+        if not len(table):
+            continue
+        src, dst, weight = table[:, 0], table[:, 1], table[:, 2]
+        # skipped edges still add their vertices, as in _load(), but negative ids never do
+        n = max(n, int(max(src.max(), dst.max())) + 1)
+        if n > 1 << 31:
+            raise ValueError('vertex ids must be below 2 ** 31')
 
-        while True: # go through all nodes
+        keep = (src != dst) & (src >= 0) & (dst >= 0) & (weight >= 0)
+        srcs.frombytes(src[keep].astype(np.int32).tobytes())
+        dsts.frombytes(dst[keep].astype(np.int32).tobytes())
+        weights.frombytes(weight[keep].tobytes())
 
-            shortest = float('inf') # we have not traversed anything yet, set to default
-            shortest_id = -666      # the number of the beast, i.e a flag
+    # the arrays live on only as the buffers of these views, so they are freed with them
+    return (np.frombuffer(srcs, dtype=np.int32), np.frombuffer(dsts, dtype=np.int32),
+            np.frombuffer(weights, dtype=np.float64), n)
 
-            for i in range(self.v_count):   # go through and all indices in visited/distances and update shortest path
-                if distances[i] < shortest and not visited[i]:
-                    shortest = distances[i]
-                    shortest_id = i
 
-            if shortest_id == -666: # all node have been visited
-                return distances
+def _parse_edge_rows(rows, header=True):
+    """
+    Description:    Converts the field lists of an edge list file to (src, dst, weight) tuples
+    Input(s):       rows:   an iterable of field lists, as from iter_edge_rows()
+                    header: True to skip the first row if it is not numeric
+    Output(s):      yields (src, dst, weight) tuples, the weight is 1 when the line has none
+    """
 
-            for i in range(self.v_count):
-                if self.adj_matrix[shortest_id][i] != 0 and distances[i] > distances[shortest_id] \
-                        + self.adj_matrix[shortest_id][i]:
-                    distances[i] = distances[shortest_id] + self.adj_matrix[shortest_id][i]
+    first = header
+    for fields in rows:
+        try:
+            src, dst = int(fields[0]), int(fields[1])
+        except ValueError:
+            if first:
+                first = False
+                continue    # a header line
+            raise
+        except IndexError:
+            raise ValueError('every line needs a source and a destination') from None
+        first = False
+
+        weight = 1
+        if len(fields) > 2:
+            weight = float(fields[2])
+            if weight.is_integer():
+                weight = int(weight)
+        yield src, dst, weight
+
+
+def _dijkstra_chunk(sources, graph=None) -> []:
+    """
+    Description:    Runs Dijkstra's algorithm from each source on the worker's graph
+    Input(s):       sources:    a list of source vertices
+                    graph:      the graph to search, the worker's graph when None
+    Output(s):      a list of (source, array('d') of distances) pairs
+    """
 
-            visited[shortest_id] = True
+    graph = _worker_graph if graph is None else graph
+    return [(src, array('d', graph.dijkstra(src))) for src in sources]
 
 
 if __name__ == '__main__':
@@ -0,0 +1,97 @@
+# Course:       CS261 - Data Structures
+# Author:       Derek Hand
+# Assignment:   Portfolio Project
+# Description:  A buffer of edge additions and removals that is applied to a graph in bulk, used by the graphs'
+#               batch() context managers
+
+from contextlib import contextmanager
+
+
+class EdgeBatch:
+    """
+    Class to collect edge changes for one graph and apply them together
+    - calls take the same arguments as the graph's add_edge() and remove_edge(), nothing is checked until commit()
+    - consecutive additions are applied with one add_edges() call and consecutive removals with one remove_edges()
+      call, so the changes land in the order they were made
+    """
+
+    def __init__(self, graph):
+        self._graph = graph
+        self._runs = []
+
+    def __len__(self):
+        return sum(len(edges) for _, edges in self._runs)
+
+    def _append(self, adding: bool, edge) -> None:
+        if self._runs and self._runs[-1][0] == adding:
+            self._runs[-1][1].append(edge)
+        else:
+            self._runs.append((adding, [edge]))
+
+    def add_edge(self, *edge) -> None:
+        """
+        Description:    Queues an edge to add
+        Input(s):       edge:   the arguments of the graph's add_edge()
+        Output(s):      None
+        """
+
+        self._append(True, edge)
+
+    def remove_edge(self, *edge) -> None:
+        """
+        Description:    Queues an edge to remove
+        Input(s):       edge:   the arguments of the graph's remove_edge()
+        Output(s):      None
+        """
+
+        self._append(False, edge)
+
+    def add_edges(self, edges) -> None:
+        """
+        Description:    Queues many edges to add
+        Input(s):       edges:  an iterable of edge tuples, as taken by the graph's add_edges()
+        Output(s):      None
+        """
+
+        for edge in edges:
+            self._append(True, edge)
+
+    def remove_edges(self, edges) -> None:
+        """
+        Description:    Queues many edges to remove
+        Input(s):       edges:  an iterable of edge tuples, as taken by the graph's remove_edges()
+        Output(s):      None
+        """
+
+        for edge in edges:
+            self._append(False, edge)
+
+    def commit(self) -> None:
+        """
+        Description:    Applies the queued changes to the graph and empties the batch, holding the graph's lock so a
+                        snapshot taken meanwhile sees all of them or none
+        Input(s):       None
+        Output(s):      None
+        """
+
+        runs, self._runs = self._runs, []
+        with self._graph._lock:
+            for adding, edges in runs:
+                if adding:
+                    self._graph.add_edges(edges)
+                else:
+                    self._graph.remove_edges(edges)
+
+
+@contextmanager
+def edge_batch(graph):
+    """
+    Description:    Yields an EdgeBatch for the graph and commits it when the block exits normally. If the block
+                    raises, the queued changes are dropped and the graph is left as it was
+    Input(s):       graph:  the graph to change
+    Output(s):      yields the EdgeBatch
+    """
+
+    batch = EdgeBatch(graph)
+    yield batch
+    batch.commit()
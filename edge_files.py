@@ -0,0 +1,153 @@
+# Course:       CS261 - Data Structures
+# Author:       Derek Hand
+# Assignment:   Portfolio Project
+# Description:  Streaming readers for edge list files (CSV, TSV or whitespace separated), read in bounded chunks
+
+try:
+    import numpy as np
+except ImportError:     # numpy is optional, only iter_numeric_blocks() needs it
+    np = None
+
+
+def sniff_delimiter(line: str):
+    """
+    Description:    Guesses the field delimiter of an edge list from one of its lines
+    Input(s):       line:   a data line of the file
+    Output(s):      '\\t' or ',' if the line contains one, otherwise None meaning any run of whitespace
+    """
+
+    if '\t' in line:
+        return '\t'
+    if ',' in line:
+        return ','
+    return None
+
+
+def iter_edge_rows(path: str, delimiter='auto', chunk_size=1 << 20, header=False):
+    """
+    Description:    Lazily yields the fields of each data line of an edge list file. The file is read chunk_size
+                    bytes at a time, so memory stays bounded however large it is. Blank lines and lines starting with
+                    '#' are skipped
+    Input(s):       path:       the file to read
+                    delimiter:  the field separator, None for whitespace, or 'auto' to sniff it from the first line
+                    chunk_size: roughly how many bytes to read per chunk
+                    header:     True to skip the first data line, which holds column names
+    Output(s):      yields a list of stripped field strings per line
+    """
+
+    with open(path) as file:
+        while True:
+            lines = file.readlines(chunk_size)
+            if not lines:
+                return
+
+            for line in lines:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if delimiter == 'auto':
+                    delimiter = sniff_delimiter(line)
+                if header:
+                    header = False
+                    continue
+                yield [field.strip() for field in line.split(delimiter)]
+
+
+def iter_numeric_blocks(path: str, chunk_size=1 << 24, delimiter='auto', header='auto'):
+    """
+    Description:    Lazily yields the edges of an all-numeric edge list file as 2-D float arrays, parsing each chunk
+                    of the file in one vectorized call. The delimiter is treated as whitespace and comment lines are
+                    dropped. The fields of every line are counted, so lines with and without a weight can be mixed,
+                    and a line with fewer than two fields or a field that is not a number raises ValueError. Requires
+                    numpy
+    Input(s):       path:       the file to read
+                    chunk_size: roughly how many bytes to parse per block
+                    delimiter:  the field separator, None for whitespace, or 'auto' for commas, tabs or whitespace
+                    header:     True to skip the first data line, False to parse it, or 'auto' to skip it only when
+                                it is not numeric
+    Output(s):      yields float64 arrays with src, dst and weight columns and one row per line, the weight is 1 when
+                    the line has none and fields after the third are ignored
+    """
+
+    if np is None:
+        raise ImportError('iter_numeric_blocks requires numpy to be installed')
+
+    if delimiter == 'auto':
+        separators = (b',', b'\t')
+    elif delimiter is None:
+        separators = ()
+    else:
+        separators = (delimiter.encode(),)
+
+    rest = b''
+    with open(path, 'rb') as file:
+        while True:
+            data = file.read(chunk_size)
+            if data:
+                data = rest + data
+                cut = data.rfind(b'\n')
+                if cut < 0:
+                    rest = data
+                    continue
+                text, rest = data[:cut + 1], data[cut + 1:]
+            elif rest:
+                text, rest = rest, b''
+            else:
+                return
+
+            for separator in separators:
+                text = text.replace(separator, b' ')
+            if b'#' in text:
+                text = b'\n'.join(line for line in text.split(b'\n') if not line.lstrip().startswith(b'#'))
+
+            if header:
+                lines = text.split(b'\n')
+                for i, line in enumerate(lines):
+                    fields = line.split()
+                    if not fields:
+                        continue
+                    if header == 'auto':
+                        try:
+                            [float(field) for field in fields]
+                        except ValueError:      # a header line
+                            lines[i] = b''
+                    else:
+                        lines[i] = b''
+                    header = False
+                    break
+                text = b'\n'.join(lines)
+
+            counts = _field_counts(text)
+            if not len(counts):
+                continue
+            if counts.min() < 2:
+                raise ValueError(f'{path}: every line needs a source and a destination')
+            try:
+                values = np.fromstring(text.decode('ascii'), dtype=np.float64, sep=' ')
+            except ValueError:     # newer numpy raises on trailing text instead of stopping short
+                values = None
+            if values is None or values.size != counts.sum():
+                raise ValueError(f'{path}: every field must be a number')
+
+            first = np.cumsum(counts) - counts
+            weight = np.ones(len(counts))
+            weighted = counts > 2
+            weight[weighted] = values[first[weighted] + 2]
+            yield np.column_stack((values[first], values[first + 1], weight))
+
+
+def _field_counts(text: bytes):
+    """
+    Description:    Counts the whitespace separated fields on each non-blank line of a chunk, vectorized over its bytes
+    Input(s):       text:   whole lines of the file, with the delimiter already replaced by spaces
+    Output(s):      an integer array with one count per non-blank line, in file order
+    """
+
+    data = np.frombuffer(text, dtype=np.uint8)
+    blank = data <= 32      # spaces, newlines and other control characters
+    starts = ~blank
+    starts[1:] &= blank[:-1]
+    newlines = np.flatnonzero(data == 10)
+    line = np.searchsorted(newlines, np.flatnonzero(starts))
+    counts = np.bincount(line, minlength=len(newlines) + 1)
+    return counts[counts > 0]
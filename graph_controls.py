@@ -0,0 +1,100 @@
+# Course:       CS261 - Data Structures
+# Author:       Derek Hand
+# Assignment:   Portfolio Project
+# Description:  The query cache and instrumentation switches shared by both graph classes, and the lock that keeps
+#               snapshots from seeing a mutation half done
+
+from functools import wraps
+
+from instrumentation import Instrumentation, instrument, uninstrument
+from query_cache import QueryCache
+
+
+def locked(method):
+    """
+    Description:    Decorator that runs a graph method holding the graph's _lock, a reentrant lock so locked methods
+                    can call each other. The graphs lock every mutation and snapshot(), so a snapshot taken from
+                    another thread always sees the graph between two mutations, never in the middle of one
+    Input(s):       method: the method to wrap
+    Output(s):      the wrapped method
+    """
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class GraphControls:
+    """
+    Mixin class with the methods that turn a graph's query cache and instrumentation on and off
+    - the graph keeps the cache in _cache and the statistics in _instrumentation, None while disabled
+    - each graph class lists the methods to record in instrumented_methods. The lazy iter_* generators are left out,
+      since a call only creates the generator
+    """
+
+    instrumented_methods = ()
+
+    def enable_cache(self, max_bytes=64 * 1024 * 1024) -> None:
+        """
+        Description:    Starts memoizing the results of the graph's searches until the graph is next modified
+        Input(s):       max_bytes:  the memory budget of the cache, least recently used results are evicted first
+        Output(s):      None
+        """
+
+        self._cache = QueryCache(max_bytes)
+
+    def disable_cache(self) -> None:
+        """
+        Description:    Stops memoizing query results and drops the cache
+        Input(s):       None
+        Output(s):      None
+        """
+
+        self._cache = None
+
+    def cache_stats(self) -> dict:
+        """
+        Description:    Returns the hit, miss and eviction counts and the size of the query cache
+        Input(s):       None
+        Output(s):      a dict of statistics, empty if the cache is disabled
+        """
+
+        if self._cache is None:
+            return dict()
+        return self._cache.stats()
+
+    def enable_instrumentation(self, sink=None) -> None:
+        """
+        Description:    Starts recording call counts, wall time histograms and work counters for every method in
+                        instrumented_methods on this graph. Until then the methods run unwrapped and cost nothing extra
+        Input(s):       sink:   if provided, a function called with {method, seconds, counters} after every call
+        Output(s):      None
+        """
+
+        self.disable_instrumentation()
+        self._instrumentation = Instrumentation(sink)
+        instrument(self, self.instrumented_methods, self._instrumentation)
+
+    def disable_instrumentation(self) -> None:
+        """
+        Description:    Stops recording calls and drops the statistics
+        Input(s):       None
+        Output(s):      None
+        """
+
+        uninstrument(self, self.instrumented_methods)
+        self._instrumentation = None
+
+    def instrumentation_snapshot(self) -> dict:
+        """
+        Description:    Returns the statistics recorded so far for each method
+        Input(s):       None
+        Output(s):      {method: {calls, seconds, max_seconds, histogram, counters}}, empty when disabled
+        """
+
+        if self._instrumentation is None:
+            return dict()
+        return self._instrumentation.snapshot()
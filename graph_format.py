@@ -0,0 +1,96 @@
+# Course:       CS261 - Data Structures
+# Author:       Derek Hand
+# Assignment:   Portfolio Project
+# Description:  A versioned binary file layout for graph snapshots, made of named typed arrays that can be memory
+#               mapped and used without copying
+
+import mmap
+import struct
+import sys
+from array import array
+
+MAGIC = b'CS261GR\x00'
+FORMAT_VERSION = 1
+
+# magic, format version, graph kind ('U' or 'D'), number of sections
+HEADER = struct.Struct('<8sHc5xI')
+# section name, array typecode, byte offset of the data from the start of the file, number of items
+SECTION = struct.Struct('<16sc7xQQ')
+
+
+def _aligned(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def write_graph_file(path: str, kind: str, sections: dict) -> None:
+    """
+    Description:    Writes a graph file. Each section's data starts on an 8 byte boundary so it can be mapped
+                    straight into a typed memoryview, and all numbers are little endian
+    Input(s):       path:       the file to write
+                    kind:       'U' for an UndirectedGraph or 'D' for a DirectedGraph
+                    sections:   a dict of section name to array.array
+    Output(s):      None
+    """
+
+    offset = _aligned(HEADER.size + SECTION.size * len(sections))
+    table = []
+    for name, values in sections.items():
+        table.append(SECTION.pack(name.encode(), values.typecode.encode(), offset, len(values)))
+        offset = _aligned(offset + values.itemsize * len(values))
+
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, kind.encode(), len(sections)))
+        for entry in table:
+            file.write(entry)
+
+        for values in sections.values():
+            file.write(b'\0' * (_aligned(file.tell()) - file.tell()))
+            if sys.byteorder != 'little':
+                values = array(values.typecode, values)
+                values.byteswap()
+            values.tofile(file)
+
+
+def read_graph_file(path: str, use_mmap=True) -> (str, dict):
+    """
+    Description:    Reads a graph file. With use_mmap the sections are read only memoryviews into a shared memory
+                    map of the file, so nothing is copied and processes loading the same file share its pages
+                    through the page cache. Otherwise the sections are copied into array.array objects
+    Input(s):       path:       the file to read
+                    use_mmap:   whether to map the file instead of reading it
+    Output(s):      kind:       'U' or 'D'
+                    sections:   a dict of section name to memoryview or array.array
+    """
+
+    if sys.byteorder != 'little':
+        use_mmap = False    # the data has to be byte swapped, which needs a copy
+
+    with open(path, 'rb') as file:
+        if use_mmap:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buffer = file.read()
+    view = memoryview(buffer)
+
+    magic, version, kind, count = HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError(f'{path} is not a graph file')
+    if version != FORMAT_VERSION:
+        raise ValueError(f'{path} has format version {version}, expected {FORMAT_VERSION}')
+
+    sections = dict()
+    for i in range(count):
+        name, typecode, offset, length = SECTION.unpack_from(view, HEADER.size + SECTION.size * i)
+        typecode = typecode.decode()
+        size = array(typecode).itemsize * length
+        data = view[offset:offset + size]
+
+        if use_mmap:
+            values = data.cast(typecode)
+        else:
+            values = array(typecode, data.tobytes())
+            if sys.byteorder != 'little':
+                values.byteswap()
+        sections[name.rstrip(b'\0').decode()] = values
+
+    return kind.decode(), sections
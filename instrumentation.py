@@ -0,0 +1,185 @@
+# Course:       CS261 - Data Structures
+# Author:       Derek Hand
+# Assignment:   Portfolio Project
+# Description:  Opt-in per-method instrumentation for the graph classes: call counts, wall time histograms and work
+#               counters, reported through snapshots and an optional sink
+
+import time
+from functools import wraps
+
+
+class Instrumentation:
+    """
+    Class to collect statistics about the calls made to one graph
+    - per method: the number of calls, the total and largest wall time, and a histogram of wall times in power of two
+      microsecond buckets
+    - per method: the sums of the work counters the graph's search loops measured, such as vertices visited. A call
+      answered without searching, such as a query cache hit, reports none
+    - every call is also passed to the sink, if one is set, as a dict of the method, its wall time and its counters
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.methods = dict()
+
+    def record(self, method: str, seconds: float, counters=None) -> None:
+        """
+        Description:    Adds one call to the statistics of a method and passes it on to the sink
+        Input(s):       method:     the method name
+                        seconds:    the wall time of the call
+                        counters:   a dict of work counters for the call, or None
+        Output(s):      None
+        """
+
+        stats = self.methods.get(method)
+        if stats is None:
+            stats = self.methods[method] = {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'histogram': dict(),
+                                            'counters': dict()}
+
+        stats['calls'] += 1
+        stats['seconds'] += seconds
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
+        bucket = histogram_bucket(seconds)
+        stats['histogram'][bucket] = stats['histogram'].get(bucket, 0) + 1
+        if counters:
+            totals = stats['counters']
+            for name, value in counters.items():
+                totals[name] = totals.get(name, 0) + value
+
+        if self.sink is not None:
+            self.sink({'method': method, 'seconds': seconds, 'counters': counters or dict()})
+
+    def snapshot(self) -> dict:
+        """
+        Description:    Returns a copy of the statistics so far, safe to keep while more calls are recorded
+        Input(s):       None
+        Output(s):      {method: {calls, seconds, max_seconds, histogram: {bucket upper bound in us: calls},
+                        counters: {name: total}}}
+        """
+
+        return {method: {**stats, 'histogram': dict(sorted(stats['histogram'].items())),
+                         'counters': dict(stats['counters'])}
+                for method, stats in self.methods.items()}
+
+    def reset(self) -> None:
+        """
+        Description:    Drops the statistics so far
+        Input(s):       None
+        Output(s):      None
+        """
+
+        self.methods.clear()
+
+
+def histogram_bucket(seconds: float) -> int:
+    """
+    Description:    Returns the histogram bucket of a wall time: the smallest power of two number of microseconds that
+                    is at least as long
+    Input(s):       seconds:    the wall time
+    Output(s):      the bucket's upper bound in microseconds
+    """
+
+    return 1 << max(0, int(seconds * 1e6) - 1).bit_length()
+
+
+def instrument(graph, methods, instrumentation: Instrumentation) -> None:
+    """
+    Description:    Shadows the given methods of one graph with timing wrappers stored on the instance, so other graphs
+                    and the class itself are untouched and an uninstrumented graph pays nothing. During a wrapped call
+                    the graph's _counters is a dict the search loops add their work to, and None otherwise
+    Input(s):       graph:              the graph to instrument, it must have a _counters attribute
+                    methods:            the names of the methods to wrap
+                    instrumentation:    where the calls are recorded
+    Output(s):      None
+    """
+
+    for name in methods:
+        graph.__dict__[name] = _timed(graph, getattr(type(graph), name).__get__(graph), name, instrumentation)
+
+
+def uninstrument(graph, methods) -> None:
+    """
+    Description:    Removes the wrappers installed by instrument(), restoring the class methods
+    Input(s):       graph:      the instrumented graph
+                    methods:    the names of the wrapped methods
+    Output(s):      None
+    """
+
+    for name in methods:
+        graph.__dict__.pop(name, None)
+
+
+def _timed(graph, method, name: str, instrumentation: Instrumentation):
+    """
+    Description:    Wraps a bound method so each call's wall time and work counters are recorded, even if it raises.
+                    The work of a nested instrumented call is also added to the call around it
+    Input(s):       graph:              the graph the method belongs to
+                    method:             the bound method
+                    name:               the method name to record under
+                    instrumentation:    where the calls are recorded
+    Output(s):      the wrapper
+    """
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        outer = graph._counters
+        counters = graph._counters = dict()
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            graph._counters = outer
+            if outer is not None:
+                for counter, value in counters.items():
+                    add_count(outer, counter, value)
+            instrumentation.record(name, seconds, counters)
+
+    return wrapper
+
+
+def add_count(counters: dict, name: str, value: int) -> None:
+    """
+    Description:    Adds to one work counter of the call being recorded
+    Input(s):       counters:   the graph's _counters dict
+                    name:       the counter
+                    value:      the amount of work to add
+    Output(s):      None
+    """
+
+    counters[name] = counters.get(name, 0) + value
+
+
+def counted_items(function, counters: dict, name: str):
+    """
+    Description:    Wraps a function that returns an iterable, such as a neighbor lookup, so every item a search
+                    actually consumes from its results adds one to a counter. Only used while instrumented
+    Input(s):       function:   the function to wrap
+                    counters:   the graph's _counters dict
+                    name:       the counter
+    Output(s):      the wrapped function, returning an iterator
+    """
+
+    def wrapper(*args):
+        for item in function(*args):
+            counters[name] = counters.get(name, 0) + 1
+            yield item
+
+    return wrapper
+
+
+def counted_calls(function, counters: dict, name: str):
+    """
+    Description:    Wraps a function, such as a queue's append, so every call adds one to a counter. Only used while
+                    instrumented
+    Input(s):       function:   the function to wrap
+                    counters:   the graph's _counters dict
+                    name:       the counter
+    Output(s):      the wrapped function
+    """
+
+    def wrapper(*args):
+        counters[name] = counters.get(name, 0) + 1
+        return function(*args)
+
+    return wrapper
@@ -0,0 +1,89 @@
+# Course:       CS261 - Data Structures
+# Author:       Derek Hand
+# Assignment:   Portfolio Project
+# Description:  Vectorized checks of many paths at once, shared by both graph classes' validate_paths(). Requires numpy
+
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:     # numpy is optional, validate_paths() falls back to is_valid_path() without it
+    np = None
+
+
+def flatten_paths(paths, pad, dtype):
+    """
+    Description:    Lays many paths out end to end in one array. A 2-D NumPy array is taken as one path per row, each
+                    ending at its first pad entry (or at the end of the row), and is flattened without any per-path
+                    Python work. Any other iterable of sequences is read once
+    Input(s):       paths:  a 2-D NumPy array padded with pad, or an iterable of sequences of vertices
+                    pad:    the value that fills the rows of a 2-D array after the end of each path
+                    dtype:  the dtype of the flat array, None to keep a 2-D array's own dtype and to use object
+                            for other paths
+    Output(s):      flat:   every path's vertices, one path after another
+                    lengths: the number of vertices in each path
+    """
+
+    if isinstance(paths, np.ndarray) and paths.ndim == 2:
+        present = np.asarray(paths != pad, dtype=bool)
+        lengths = np.where(present.all(axis=1), paths.shape[1], np.argmin(present, axis=1))
+        keep = np.arange(paths.shape[1]) < lengths[:, None]
+        flat = paths[keep]
+        return (flat if dtype is None else flat.astype(dtype, copy=False)), lengths
+
+    paths = list(paths)
+    lengths = np.fromiter(map(len, paths), dtype=np.intp, count=len(paths))
+    if dtype is None:
+        flat = np.empty(int(lengths.sum()), dtype=object)
+        flat[:] = list(chain.from_iterable(paths))
+    else:
+        flat = np.fromiter(chain.from_iterable(paths), dtype=dtype, count=int(lengths.sum()))
+    return flat, lengths
+
+
+def edge_lookup(srcs, dsts, n: int):
+    """
+    Description:    Builds a vectorized edge membership test from an edge list. Each edge is encoded as one integer,
+                    src * n + dst, and queries are answered by binary search in the sorted codes
+    Input(s):       srcs:   an integer array of edge sources
+                    dsts:   an integer array of edge destinations
+                    n:      one more than the largest vertex id
+    Output(s):      a function (srcs, dsts) -> boolean array of whether each pair is an edge
+    """
+
+    codes = np.sort(np.asarray(srcs, dtype=np.int64) * n + np.asarray(dsts, dtype=np.int64))
+
+    def has_edge(src, dst):
+        queries = src.astype(np.int64) * n + dst
+        found = np.searchsorted(codes, queries)
+        found[found == len(codes)] = 0
+        return (codes[found] == queries) if len(codes) else np.zeros(len(queries), dtype=bool)
+
+    return has_edge
+
+
+def validate_flat(flat, lengths, n: int, has_edge):
+    """
+    Description:    Checks every path laid out by flatten_paths() at once: each vertex must be in range(n) and each
+                    consecutive pair must be an edge. An empty path is valid, as in is_valid_path()
+    Input(s):       flat:       the integer vertex ids of every path, one path after another
+                    lengths:    the number of vertices in each path
+                    n:          the number of vertex ids
+                    has_edge:   a function (srcs, dsts) -> boolean array, given only in-range ids
+    Output(s):      a boolean array with one entry per path
+    """
+
+    count = len(lengths)
+    owner = np.repeat(np.arange(count), lengths)
+    in_range = (flat >= 0) & (flat < n)
+    bad = np.bincount(owner[~in_range], minlength=count)
+
+    # consecutive entries of the same path are its steps, the rest straddle two paths
+    step = owner[:-1] == owner[1:]
+    srcs, dsts = flat[:-1][step], flat[1:][step]
+    checkable = in_range[:-1][step] & in_range[1:][step]
+    exists = np.zeros(len(srcs), dtype=bool)
+    exists[checkable] = has_edge(srcs[checkable], dsts[checkable])
+    missing = np.bincount(owner[:-1][step][~exists], minlength=count)
+
+    return (bad == 0) & (missing == 0)
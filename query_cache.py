@@ -0,0 +1,138 @@
+# Course:       CS261 - Data Structures
+# Author:       Derek Hand
+# Assignment:   Portfolio Project
+# Description:  A memoization layer for graph queries, keyed by the query and the graph's mutation version
+
+import sys
+from collections import OrderedDict
+from functools import wraps
+
+
+class QueryCache:
+    """
+    Class to implement a least recently used cache of query results
+    - every entry belongs to one graph version, a lookup with a newer version drops all older entries
+    - the total estimated size of the cached results is kept under max_bytes
+    - counts hits, misses and evictions
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.version = None
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key, version, compute):
+        """
+        Description:    Returns a copy of the cached result for key at the given version, computing and storing it on a
+                        miss
+        Input(s):       key:        a hashable description of the query
+                        version:    the graph's current mutation version
+                        compute:    a function taking no arguments that answers the query
+        Output(s):      the query result
+        """
+
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return copy_result(entry[0])
+
+        self.misses += 1
+        result = compute()
+        size = estimate_size(result)
+        if size <= self.max_bytes:
+            self.entries[key] = (copy_result(result), size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+        return result
+
+    def clear(self) -> None:
+        """
+        Description:    Drops every cached result, keeping the statistics
+        Input(s):       None
+        Output(s):      None
+        """
+
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Description:    Returns the cache statistics
+        Input(s):       None
+        Output(s):      a dict of hits, misses, evictions, entries, bytes and max_bytes
+        """
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+        }
+
+
+def copy_result(value):
+    """
+    Description:    Copies a query result so callers cannot modify what is cached
+    Input(s):       value:  a list, tuple, array or immutable value
+    Output(s):      the copy
+    """
+
+    if isinstance(value, list):
+        return value[:]
+    if isinstance(value, tuple):
+        return tuple(copy_result(item) for item in value)
+    if hasattr(value, 'copy'):
+        return value.copy()
+    return value
+
+
+def estimate_size(value) -> int:
+    """
+    Description:    Estimates the memory held by a query result, counting containers one level deep
+    Input(s):       value:  the result
+    Output(s):      the estimated size in bytes
+    """
+
+    if hasattr(value, 'nbytes'):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def cached_query(method):
+    """
+    Description:    Decorates a graph query method so its results go through the graph's QueryCache when one is
+                    enabled. The graph must have _cache (a QueryCache or None) and _version attributes, and the
+                    query's arguments must be hashable
+    Input(s):       method:     the query method
+    Output(s):      the wrapped method
+    """
+
+    name = method.__name__
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = self._cache
+        if cache is None:
+            return method(self, *args, **kwargs)
+
+        key = (name, args, tuple(sorted(kwargs.items())))
+        return cache.lookup(key, self._version, lambda: method(self, *args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,9 @@
+# Course:       CS 261 - Data Structures
+# Author:       Derek Hand
+# Assignment:   Portfolio Project
+# Description:  Puts the graph modules, which live at the top of the repository, on the import path of the tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
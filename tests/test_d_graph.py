@@ -0,0 +1,198 @@
+# Course:       CS 261 - Data Structures
+# Author:       Derek Hand
+# Assignment:   Portfolio Project
+# Description:  Tests for the DirectedGraph topological order, batch updates, query cache, multi-source searches,
+#               path validation and binary files
+
+import random
+
+import pytest
+
+from d_graph import STORAGE_KINDS, DirectedGraph, np
+
+STORAGES = sorted(STORAGE_KINDS)
+
+
+def random_graph(n: int, m: int, seed: int, storage='sparse') -> DirectedGraph:
+    """
+    Description:    Builds a seeded random graph, repeated pairs keep their last weight
+    Input(s):       n:          the number of vertices
+                    m:          the number of edges to try
+                    seed:       the random seed
+                    storage:    the backend
+    Output(s):      a DirectedGraph
+    """
+
+    rng = random.Random(seed)
+    edges = [(rng.randrange(n), rng.randrange(n), rng.randint(1, 9)) for _ in range(m)]
+    return DirectedGraph.from_edges(edges, storage, n)
+
+
+def reference_cycle(graph: DirectedGraph) -> bool:
+    """
+    Description:    Determines if a graph has a cycle by checking whether any vertex reaches itself
+    Input(s):       graph:  a DirectedGraph
+    Output(s):      True if it has a cycle
+    """
+
+    edges = graph.get_edges()
+    return any(src in graph.dfs(dst) for src, dst, _ in edges)
+
+
+def assert_topological(graph: DirectedGraph) -> None:
+    """
+    Description:    Checks that the graph's topological order puts every edge forward, or is empty for a cyclic graph
+    Input(s):       graph:  a DirectedGraph
+    Output(s):      None
+    """
+
+    order = graph.topological_order()
+    if reference_cycle(graph):
+        assert graph.has_cycle() and order == []
+        return
+
+    assert not graph.has_cycle()
+    assert sorted(order) == list(range(graph.v_count))
+    position = {v: i for i, v in enumerate(order)}
+    assert all(position[src] < position[dst] for src, dst, _ in graph.get_edges())
+
+
+def test_topological_order_follows_random_updates():
+    for seed in range(30):
+        rng = random.Random(seed)
+        graph = DirectedGraph(storage='sparse')
+        graph.add_vertices(12)
+        for _ in range(40):
+            src, dst = rng.randrange(12), rng.randrange(12)
+            if rng.random() < 0.7:
+                graph.add_edge(src, dst, rng.randint(1, 9))
+            else:
+                graph.remove_edge(src, dst)
+            assert_topological(graph)
+
+
+def test_strict_dag_skips_edges_that_close_a_cycle():
+    graph = DirectedGraph([(0, 1, 1), (1, 2, 1), (2, 3, 1)], storage='sparse', strict_dag=True)
+    graph.add_edge(3, 0)
+    graph.add_edges([(3, 1, 1), (0, 3, 5)])
+    assert graph.get_edges() == [(0, 1, 1), (0, 3, 5), (1, 2, 1), (2, 3, 1)]
+    assert graph.topological_order() == [0, 1, 2, 3]
+    assert not graph.has_cycle()
+
+
+@pytest.mark.parametrize('storage', STORAGES)
+def test_batch_updates_match_single_updates(storage):
+    rng = random.Random(1)
+    single = random_graph(30, 80, 1, storage)
+    batched = random_graph(30, 80, 1, storage)
+    adds = [(rng.randrange(30), rng.randrange(30), rng.randint(0, 9)) for _ in range(100)]
+    removes = [(rng.randrange(30), rng.randrange(30)) for _ in range(100)]
+
+    for edge in adds:
+        single.add_edge(*edge)
+    for edge in removes:
+        single.remove_edge(*edge)
+    batched.add_edges(adds)
+    batched.remove_edges(removes)
+    assert batched.get_edges() == single.get_edges()
+    assert batched.topological_order() == single.topological_order() or not single.has_cycle()
+
+
+def test_batch_applies_on_exit_and_drops_on_error():
+    graph = DirectedGraph([(0, 1, 1), (1, 2, 1)], storage='sparse')
+    with graph.batch() as batch:
+        batch.add_edge(2, 0, 4)
+        batch.remove_edge(0, 1)
+        assert graph.get_edges() == [(0, 1, 1), (1, 2, 1)]
+    assert graph.get_edges() == [(1, 2, 1), (2, 0, 4)]
+
+    with pytest.raises(RuntimeError):
+        with graph.batch() as batch:
+            batch.remove_edge(1, 2)
+            raise RuntimeError
+    assert graph.get_edges() == [(1, 2, 1), (2, 0, 4)]
+
+
+def test_query_cache_hits_until_the_graph_changes():
+    graph = random_graph(50, 150, 2)
+    expected = graph.dijkstra(0)
+    graph.enable_cache()
+    assert graph.dijkstra(0) == expected
+    result = graph.dijkstra(0)
+    assert result == expected
+    result.append('changed by the caller')
+    assert graph.dijkstra(0) == expected
+    assert graph.cache_stats()['hits'] == 2
+
+    graph.add_edge(0, 49, 1)
+    assert graph.dijkstra(0)[49] == 1
+    assert graph.cache_stats()['misses'] == 2
+
+    graph.disable_cache()
+    assert graph.cache_stats() == dict()
+
+
+@pytest.mark.parametrize('storage', STORAGES)
+def test_bfs_many_matches_single_searches(storage):
+    graph = random_graph(40, 90, 3, storage)
+    sources = [0, 5, 5, 39]
+    distances = graph.bfs_many(sources)
+    for row, src in zip(distances, sources):
+        levels = [float('inf')] * graph.v_count
+        for dst in range(graph.v_count):
+            path = graph.shortest_hop_path(src, dst)
+            if path:
+                levels[dst] = len(path) - 1
+        assert list(row) == levels
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_dijkstra_many_matches_dijkstra(processes):
+    graph = random_graph(40, 120, 4)
+    sources = list(range(0, 40, 3))
+    distances = graph.dijkstra_many(sources, processes)
+    for row, src in zip(distances, sources):
+        assert list(row) == graph.dijkstra(src)
+
+
+@pytest.mark.parametrize('storage', STORAGES)
+def test_validate_paths_matches_is_valid_path(storage):
+    graph = random_graph(20, 80, 5, storage)
+    rng = random.Random(5)
+    paths = [[rng.randrange(20) for _ in range(rng.randint(0, 5))] for _ in range(300)]
+    paths += [graph.dfs(0)[:4], [25], [0, -1]]
+    expected = [graph.is_valid_path(path) for path in paths]
+    assert list(graph.validate_paths(paths)) == expected
+
+    if np is not None:
+        padded = np.full((len(paths), 6), -1)
+        for row, path in enumerate(paths[:-1]):     # a -1 vertex would be read as padding
+            padded[row, :len(path)] = path
+        assert list(graph.validate_paths(padded[:-1])) == expected[:-1]
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_save_and_load_round_trip(tmp_path, mmap):
+    graph = random_graph(30, 100, 6)
+    graph.add_edge(2, 3, 2.5)
+    path = str(tmp_path / 'graph.bin')
+    graph.save(path)
+
+    loaded = DirectedGraph.load(path, mmap)
+    assert loaded.get_edges() == graph.get_edges()
+    assert loaded.dijkstra(0) == graph.dijkstra(0)
+    loaded.add_edge(0, 29, 1)
+    assert loaded.dijkstra(0)[29] == 1
+    assert DirectedGraph.load(path, mmap).get_edges() == graph.get_edges()
+
+
+def test_edge_file_readers_agree(tmp_path, monkeypatch):
+    path = tmp_path / 'edges.csv'
+    path.write_text('src;dst;weight\n0;1;2\n# a comment\n1;2\n2;0;3.5\n')
+    expected = [(0, 1, 2), (1, 2, 1), (2, 0, 3.5)]
+    assert DirectedGraph.from_edge_file(str(path), delimiter=';').get_edges() == expected
+
+    monkeypatch.setattr('d_graph.np', None)
+    assert DirectedGraph.from_edge_file(str(path), delimiter=';').get_edges() == expected
+    with pytest.raises(ValueError):
+        DirectedGraph.from_edge_file(str(path), delimiter=';', header=False)
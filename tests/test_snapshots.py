@@ -0,0 +1,120 @@
+# Course:       CS 261 - Data Structures
+# Author:       Derek Hand
+# Assignment:   Portfolio Project
+# Description:  Tests for graph snapshots, taken and read on other threads while one thread keeps modifying the graph
+
+import random
+import sys
+import threading
+
+import pytest
+
+from d_graph import DirectedGraph
+from ud_graph import UndirectedGraph
+
+
+@pytest.fixture(autouse=True)
+def frequent_switches():
+    """
+    Description:    Makes the interpreter switch threads every few microseconds, so races show up within a short test
+    Input(s):       None
+    Output(s):      yields once the interval is set, and restores it afterwards
+    """
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def race(graph, mutate, read, snapshots=150) -> None:
+    """
+    Description:    Runs mutate() on a writer thread while this thread takes snapshots of the graph, and checks that
+                    each snapshot still reads the same after the writer has moved on
+    Input(s):       graph:      the graph to modify
+                    mutate:     a function taking the graph and a random.Random, making one change
+                    read:       a function taking a snapshot and returning what it holds
+                    snapshots:  how many snapshots to take
+    Output(s):      None
+    """
+
+    done = threading.Event()
+    errors = []
+
+    def writer():
+        rng = random.Random(0)
+        try:
+            while not done.is_set():
+                mutate(graph, rng)
+        except Exception as error:      # reported on the main thread
+            errors.append(error)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        taken = []
+        for _ in range(snapshots):
+            view = graph.snapshot()
+            taken.append((view, read(view)))
+        for view, seen in taken:
+            assert read(view) == seen
+    finally:
+        done.set()
+        thread.join()
+    assert errors == []
+
+
+def test_undirected_snapshots_taken_during_mutations_do_not_change():
+    graph = UndirectedGraph(('0', str(k)) for k in range(1, 60))    # '0' is a hub
+
+    def mutate(graph, rng):
+        u, v = str(rng.randrange(80)), str(rng.randrange(80))
+        if rng.random() < 0.6:
+            graph.add_edge(u, v)
+        elif rng.random() < 0.8:
+            graph.remove_edge(u, v)
+        else:
+            graph.remove_vertex(u)
+
+    race(graph, mutate, lambda view: (view.get_edges(), view.count_connected_components()))
+
+
+@pytest.mark.parametrize('storage', ['dense', 'sparse', 'numpy'])
+def test_directed_snapshots_taken_during_mutations_do_not_change(storage):
+    graph = DirectedGraph([(0, k, 1) for k in range(1, 40)], storage=storage)
+
+    def mutate(graph, rng):
+        src, dst = rng.randrange(40), rng.randrange(40)
+        if rng.random() < 0.6:
+            graph.add_edge(src, dst, rng.randint(1, 9))
+        else:
+            graph.remove_edge(src, dst)
+
+    race(graph, mutate, lambda view: (view.get_edges(), view.topological_order()))
+
+
+def test_directed_snapshot_during_a_batch_sees_all_of_it_or_none():
+    graph = DirectedGraph(storage='sparse')
+    graph.add_vertices(50)
+
+    def mutate(graph, rng):
+        with graph.batch() as batch:
+            batch.add_edges((k, k + 1, 1) for k in range(49))
+            batch.remove_edges((k, k + 1) for k in range(49))
+
+    def read(view):
+        edges = view.get_edges()
+        assert len(edges) in (0, 49)
+        return edges
+
+    race(graph, mutate, read)
+
+
+def test_snapshots_reject_mutations():
+    undirected = UndirectedGraph([('A', 'B')]).snapshot()
+    directed = DirectedGraph([(0, 1, 1)], storage='sparse').snapshot()
+    with pytest.raises(TypeError):
+        undirected.add_edge('B', 'C')
+    with pytest.raises(TypeError):
+        directed.remove_edge(0, 1)
+    assert undirected.get_edges() == [('A', 'B')] and directed.get_edges() == [(0, 1, 1)]
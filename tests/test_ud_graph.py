@@ -0,0 +1,205 @@
+# Course:       CS 261 - Data Structures
+# Author:       Derek Hand
+# Assignment:   Portfolio Project
+# Description:  Tests for the UndirectedGraph hub index, batch updates, query cache, path validation and binary files
+
+import random
+import time
+
+import pytest
+
+from ud_graph import HUB_DEGREE, PackedRows, UndirectedGraph, np
+
+
+def star(degree: int) -> UndirectedGraph:
+    """
+    Description:    Builds a star graph, one hub joined to degree leaves named '0', '1', ...
+    Input(s):       degree: the number of leaves
+    Output(s):      an UndirectedGraph
+    """
+
+    return UndirectedGraph.from_edges(('hub', str(k)) for k in range(degree))
+
+
+def hub_cost(degree: int, remove) -> float:
+    """
+    Description:    Times removing 500 leaves' edges from the hub of a fresh star graph, keeping the fastest of five
+                    runs
+    Input(s):       degree: the number of leaves of the star
+                    remove: a function taking the graph and a leaf name, removing it or its edge
+    Output(s):      the fastest run in seconds
+    """
+
+    best = float('inf')
+    for _ in range(5):
+        graph = star(degree)
+        start = time.perf_counter()
+        for k in range(500):
+            remove(graph, str(k))
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def assert_index(graph: UndirectedGraph) -> None:
+    """
+    Description:    Checks that every hub index maps each neighbor to its position in the neighbor array
+    Input(s):       graph:  an UndirectedGraph
+    Output(s):      None
+    """
+
+    for i, hub in graph._hubs.items():
+        neighbors = graph._adj[i]
+        assert len(hub) == len(neighbors)
+        assert all(neighbors[k] == j for j, k in hub.items())
+
+
+def test_hub_delete_cost_does_not_grow_with_degree():
+    small = hub_cost(2000, lambda graph, leaf: graph.remove_edge('hub', leaf))
+    large = hub_cost(200000, lambda graph, leaf: graph.remove_edge('hub', leaf))
+    assert large < 10 * small     # a scan of the hub's array would make it about 100 times slower
+
+
+def test_removing_a_leaf_of_a_hub_does_not_grow_with_its_degree():
+    small = hub_cost(2000, lambda graph, leaf: graph.remove_vertex(leaf))
+    large = hub_cost(200000, lambda graph, leaf: graph.remove_vertex(leaf))
+    assert large < 10 * small
+
+
+def test_hub_index_follows_removals():
+    graph = star(4 * HUB_DEGREE)
+    graph.remove_edge('hub', '0')
+    graph.remove_edges([('hub', str(k)) for k in range(1, 10)])
+    graph.remove_vertex('10')
+    graph.remove_vertices(['11', '12', 'missing'])
+    assert_index(graph)
+    assert sorted(graph.adj_list['hub'], key=int) == [str(k) for k in range(13, 4 * HUB_DEGREE)]
+    assert graph.is_valid_path(['13', 'hub', str(4 * HUB_DEGREE - 1)])
+    assert not graph.is_valid_path(['0', 'hub'])
+
+
+def test_hub_index_is_dropped_below_half_the_threshold():
+    graph = star(HUB_DEGREE + 1)
+    assert 'hub' in graph.adj_list and graph._ids['hub'] in graph._hubs
+    graph.remove_edges([('hub', str(k)) for k in range(HUB_DEGREE // 2 + 2)])
+    assert graph._ids['hub'] not in graph._hubs
+    assert len(graph.adj_list['hub']) == HUB_DEGREE // 2 - 1
+
+
+def test_mmap_load_indexes_hubs_and_thaws_on_mutation(tmp_path):
+    graph = star(2 * HUB_DEGREE)
+    graph.add_edges([('0', '1'), ('ä', 'ö')])
+    path = str(tmp_path / 'star.graph')
+    graph.save(path)
+
+    loaded = UndirectedGraph.load(path)
+    assert isinstance(loaded._adj, PackedRows)
+    assert loaded._ids['hub'] in loaded._hubs
+    assert_index(loaded)
+    assert loaded.get_edges() == graph.get_edges()
+    assert loaded.is_valid_path(['ä', 'ö']) and loaded.is_valid_path(['1', 'hub', '5'])
+
+    view = loaded.snapshot()
+    loaded.remove_edge('hub', '5')
+    loaded.add_edge('ö', 'hub')
+    assert_index(loaded)
+    assert not loaded.is_valid_path(['hub', '5']) and loaded.is_valid_path(['ö', 'hub'])
+    assert view.get_edges() == graph.get_edges()
+
+
+def random_edges(n: int, m: int, seed: int) -> []:
+    """
+    Description:    Builds a seeded list of random vertex name pairs, loops and repeats included
+    Input(s):       n:      the number of vertex names
+                    m:      the number of pairs
+                    seed:   the random seed
+    Output(s):      [(u, v)]
+    """
+
+    rng = random.Random(seed)
+    return [(str(rng.randrange(n)), str(rng.randrange(n))) for _ in range(m)]
+
+
+def test_batch_updates_match_single_updates():
+    edges = random_edges(40, 120, 1)
+    adds, removes = random_edges(40, 150, 2), random_edges(40, 150, 3) + edges[:30]
+    single, batched = UndirectedGraph(edges), UndirectedGraph(edges)
+
+    for u, v in adds:
+        single.add_edge(u, v)
+    for u, v in removes:
+        single.remove_edge(u, v)
+    batched.add_edges(adds)
+    batched.remove_edges(removes)
+    assert batched.get_edges() == single.get_edges()
+    assert batched.count_connected_components() == single.count_connected_components()
+    assert batched.has_cycle() == single.has_cycle()
+
+
+def test_batch_applies_on_exit_and_drops_on_error():
+    graph = UndirectedGraph([('A', 'B')])
+    with graph.batch() as batch:
+        batch.add_edge('B', 'C')
+        batch.remove_edge('A', 'B')
+        assert graph.get_edges() == [('A', 'B')]
+    assert graph.get_edges() == [('B', 'C')]
+
+    with pytest.raises(RuntimeError):
+        with graph.batch() as batch:
+            batch.add_edge('C', 'D')
+            raise RuntimeError
+    assert graph.get_edges() == [('B', 'C')]
+
+
+def test_query_cache_hits_until_the_graph_changes():
+    graph = UndirectedGraph(random_edges(30, 60, 4))
+    expected = graph.bfs('0')
+    graph.enable_cache()
+    assert graph.bfs('0') == expected
+    graph.bfs('0').append('changed by the caller')
+    assert graph.bfs('0') == expected
+    assert graph.cache_stats()['hits'] == 2
+
+    graph.add_edge('0', 'new')
+    assert 'new' in graph.bfs('0')
+
+
+def test_validate_paths_matches_is_valid_path():
+    graph = UndirectedGraph(random_edges(15, 40, 5))
+    rng = random.Random(5)
+    names = [str(k) for k in range(17)]
+    paths = [[rng.choice(names) for _ in range(rng.randint(0, 5))] for _ in range(300)]
+    paths += [graph.dfs('0')[:4], ['missing']]
+    expected = [graph.is_valid_path(path) for path in paths]
+    assert list(graph.validate_paths(paths)) == expected
+
+    if np is not None:
+        padded = np.full((len(paths), 6), '', dtype=object)
+        for row, path in enumerate(paths):
+            padded[row, :len(path)] = path
+        assert list(graph.validate_paths(padded)) == expected
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_save_and_load_round_trip(tmp_path, mmap):
+    graph = UndirectedGraph(random_edges(30, 80, 6))
+    graph.remove_vertex('3')
+    path = str(tmp_path / 'graph.bin')
+    graph.save(path)
+
+    loaded = UndirectedGraph.load(path, mmap)
+    assert loaded.get_edges() == graph.get_edges()
+    assert loaded.count_connected_components() == graph.count_connected_components()
+    loaded.add_edge('3', '0')
+    assert loaded.is_valid_path(['3', '0'])
+
+
+def test_edge_file_reader_rejects_short_lines(tmp_path):
+    path = tmp_path / 'edges.txt'
+    path.write_text('u v\nA B\nC\n')
+    with pytest.raises(ValueError):
+        UndirectedGraph.from_edge_file(str(path), header=True)
+
+    path.write_text('u v\nA B\n')
+    assert UndirectedGraph.from_edge_file(str(path), header=True).get_edges() == [('A', 'B')]
+    with pytest.raises(ValueError):
+        UndirectedGraph.from_edge_file(str(path), header='auto')
@@ -3,8 +3,117 @@
 # Assignment:   Portfolio Project Part 1: Undirected Graph via Adjacency List
 # Description:  An implementation of an undirected class by using an adjacency list
 
+from array import array
+from collections import deque
+from collections.abc import Mapping, Sequence
+from threading import RLock
 
-class UndirectedGraph:
+from bidirectional import bidirectional_bfs
+from edge_batch import edge_batch
+from edge_files import iter_edge_rows
+from graph_format import read_graph_file, write_graph_file
+from graph_controls import GraphControls, locked
+from instrumentation import add_count, counted_calls, counted_items
+from path_validation import edge_lookup, flatten_paths, validate_flat
+from query_cache import cached_query
+
+try:
+    import numpy as np
+except ImportError:     # numpy is optional, only validate_paths() uses it
+    np = None
+
+
+HUB_DEGREE = 32     # vertices with more neighbors than this also keep a hashed index of them
+
+# the methods enable_instrumentation() records
+INSTRUMENTED_METHODS = ('add_vertex', 'add_edge', 'add_edges', 'remove_edge', 'remove_edges', 'remove_vertex',
+                        'remove_vertices', 'get_vertices', 'get_edges', 'is_valid_path', 'validate_paths',
+                        'sorted_neighbors', 'dfs', 'bfs', 'shortest_hop_path', 'count_connected_components',
+                        'same_component', 'has_cycle', 'closes_cycle', 'snapshot', 'save')
+
+
+class Neighbors:
+    """
+    Class to give read-only, list-like access to the neighbors of a single vertex by name
+    - in the order the edges were added, so it prints and iterates like the list it replaces, except that removing
+      an edge of a hub moves its last neighbor into the gap
+    - membership tests go through the graph's integer ids
+    """
+
+    def __init__(self, graph, i):
+        self._graph = graph
+        self._i = i
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __contains__(self, v):
+        j = self._graph._ids.get(v)
+        return j is not None and self._graph._adjacent(self._i, j)
+
+    def __iter__(self):
+        names = self._graph._names
+        return (names[j] for j in self._graph._adj[self._i])
+
+    def __len__(self):
+        return len(self._graph._adj[self._i])
+
+    def __eq__(self, other):
+        if isinstance(other, (Neighbors, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+
+class Adjacency(Mapping):
+    """
+    Class to give read-only, dict-like access to a graph's adjacency list by vertex name
+    - vertices come in the order they were added
+    - the graph itself only stores integer ids, names are looked up here at the boundary
+    """
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, v):
+        return Neighbors(self._graph, self._graph._ids[v])
+
+    def __contains__(self, v):
+        return v in self._graph._ids
+
+    def __iter__(self):
+        return iter(self._graph._ids)
+
+    def __len__(self):
+        return len(self._graph._ids)
+
+
+class PackedRows(Sequence):
+    """
+    Class to read a loaded graph's compressed sparse rows as its list of neighbor arrays
+    - row i is targets[offsets[i]:offsets[i + 1]], sliced when it is read, so no object is kept per vertex
+    - read only, the graph copies the rows into regular arrays on its first mutation
+    """
+
+    def __init__(self, offsets, targets):
+        self._offsets = offsets
+        self._targets = targets
+
+    def __getitem__(self, i):
+        return self._targets[self._offsets[i]:self._offsets[i + 1]]
+
+    def __iter__(self):
+        targets = self._targets
+        offsets = iter(self._offsets)
+        lo = next(offsets)
+        for hi in offsets:
+            yield targets[lo:hi]
+            lo = hi
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+
+class UndirectedGraph(GraphControls):
     """
     Class to implement undirected graph
     - duplicate edges not allowed
@@ -13,18 +122,44 @@ class UndirectedGraph:
     - vertex names are strings
     """
 
+    instrumented_methods = INSTRUMENTED_METHODS
+
     def __init__(self, start_edges=None):
         """
-        Store graph info as adjacency list
-        DO NOT CHANGE THIS METHOD IN ANY WAY
+        Store graph info as an adjacency list over integer vertex ids. _ids maps each name to its id in insertion
+        order and _names maps ids back, _adj[i] is an array of vertex i's neighbor ids, and vertices with more than
+        HUB_DEGREE neighbors also get a dict in _hubs from each neighbor to its position in that array. A removed
+        vertex leaves None in _names and _adj and its id is reused. Plus a lazily built index of each vertex's
+        neighbors in sorted order and a union-find forest over the connected components (None while it needs
+        rebuilding). _version counts mutations so cached query results can be told apart from stale ones. _shared is
+        set while snapshots share all of this, and once the next mutation has copied the containers, _owned holds the
+        vertices whose own arrays it has copied since (None when nothing is shared). _counters is the dict the search
+        loops add their work to during an instrumented call, and _edge_index caches the edge lookup validate_paths()
+        built for one version. _lock is held by every mutation and by snapshot()
         """
-        self.adj_list = dict()
+        self._ids = dict()
+        self._names = []
+        self._adj = []
+        self._hubs = dict()
+        self._free = []
+        self._frozen = False
+        self._shared = False
+        self._owned = None
+        self._version = 0
+        self._cache = None
+        self._instrumentation = None
+        self._counters = None
+        self._edge_index = None
+        self._lock = RLock()
+        self._edge_count = 0
+        self._sorted = dict()
+        self._parent = []
+        self._size = []
+        self._component_count = 0
 
         # populate graph with initial vertices and edges (if provided)
-        # before using, implement add_vertex() and add_edge() methods
         if start_edges is not None:
-            for u, v in start_edges:
-                self.add_edge(u, v)
+            self._load(start_edges)
 
     def __str__(self):
         """
@@ -40,6 +175,447 @@ class UndirectedGraph:
 
     # ------------------------------------------------------------------ #
 
+    @property
+    def adj_list(self) -> Adjacency:
+        """
+        Read-only view of the adjacency list as {vertex: [neighbors]}, by vertex name
+        """
+        return Adjacency(self)
+
+    @classmethod
+    def from_edges(cls, edges):
+        """
+        Description:    Builds a graph from (u, v) pairs in a single pass, writing straight into the adjacency list
+                        instead of going through add_edge(). Loops and repeated edges are skipped as add_edge() would
+        Input(s):       edges:  an iterable of (u, v) pairs, read once
+        Output(s):      an UndirectedGraph
+        """
+
+        graph = cls()
+        graph._load(edges)
+        return graph
+
+    @classmethod
+    def from_edge_file(cls, path: str, delimiter='auto', header=False, chunk_size=1 << 20):
+        """
+        Description:    Builds a graph from a file with one 'u v' edge per line, separated by commas, tabs or
+                        whitespace. The file is streamed in chunks, so only the graph itself is held in memory
+        Input(s):       path:       the file to read
+                        delimiter:  the field separator, None for whitespace, or 'auto' to sniff it
+                        header:     True if the first line holds column names, False if it is an edge. Any string is
+                                    a vertex name, so unlike DirectedGraph.from_edge_file() it cannot be 'auto'
+                        chunk_size: roughly how many bytes to read per chunk
+        Output(s):      an UndirectedGraph
+        """
+
+        if header not in (True, False):
+            raise ValueError(f'header must be True or False, not {header!r}')
+
+        graph = cls()
+        graph._load(_edge_pairs(iter_edge_rows(path, delimiter, chunk_size, header)))
+        return graph
+
+    def _load(self, edges) -> None:
+        """
+        Description:    Adds (u, v) pairs to the graph in one pass, rebuilding the component forest once afterwards
+        Input(s):       edges:  an iterable of (u, v) pairs
+        Output(s):      None
+        """
+
+        self._parent = None     # one rebuild on the next query is cheaper than a union per edge
+        self.add_edges(edges)
+
+    @locked
+    def add_edges(self, edges) -> None:
+        """
+        Description:    Adds many edges at once, adding missing vertices as add_edge() does and skipping loops and
+                        edges that already exist. The adjacency arrays are appended to in one pass, and the sorted
+                        neighbor cache, the component forest and the version are updated once at the end
+        Input(s):       edges:  an iterable of (u, v) pairs, read once
+        Output(s):      None
+        """
+
+        self._writable()
+        ids = self._ids
+        adj = self._adj
+        hubs = self._hubs
+        owned = self._owned
+        vertex_count = len(ids)
+        added = 0
+        new = [] if self._parent is not None or self._sorted else None
+        for u, v in edges:
+            if u == v:
+                continue
+
+            i = ids.get(u)
+            if i is None:
+                i = self._intern(u)
+            j = ids.get(v)
+            if j is None:
+                j = self._intern(v)
+
+            # a vertex that is not a hub has at most HUB_DEGREE neighbors to scan
+            neighbors_i = adj[i]
+            hub_i = hubs.get(i)
+            if j in (neighbors_i if hub_i is None else hub_i):
+                continue
+
+            # _attach() inlined for both ends, this loop runs once per edge
+            if owned is not None:
+                if i not in owned:
+                    neighbors_i, hub_i = self._own(i), hubs.get(i)
+                if j not in owned:
+                    self._own(j)
+            neighbors_j = adj[j]
+            if hub_i is not None:
+                hub_i[j] = len(neighbors_i)
+            hub_j = hubs.get(j)
+            if hub_j is not None:
+                hub_j[i] = len(neighbors_j)
+            neighbors_i.append(j)
+            neighbors_j.append(i)
+            added += 1
+            if hub_i is None and len(neighbors_i) > HUB_DEGREE:
+                hubs[i] = _positions(neighbors_i)
+            if hub_j is None and len(neighbors_j) > HUB_DEGREE:
+                hubs[j] = _positions(neighbors_j)
+            if new is not None:
+                new.append((i, j))
+
+        if added == 0 and len(ids) == vertex_count:
+            return
+
+        self._edge_count += added
+        self._version += 1
+        if new is not None:
+            for i, j in new:
+                self._sorted.pop(i, None)
+                self._sorted.pop(j, None)
+                if self._parent is not None:
+                    self._union(i, j)
+
+    @locked
+    def remove_edges(self, edges) -> None:
+        """
+        Description:    Removes many edges at once, skipping edges that do not exist. Each edge costs O(1) at a hub
+                        and a short scan elsewhere, and the indexes and the version are updated once at the end
+        Input(s):       edges:  an iterable of (u, v) pairs
+        Output(s):      None
+        """
+
+        self._writable()
+        ids = self._ids
+        touched = []
+        for u, v in edges:
+            i, j = ids.get(u), ids.get(v)
+            if i is None or j is None or not self._adjacent(i, j):
+                continue
+
+            self._detach(i, j)
+            self._detach(j, i)
+            touched.append(i)
+            touched.append(j)
+
+        if not touched:
+            return
+
+        for i in touched:
+            self._sorted.pop(i, None)
+        self._edge_count -= len(touched) // 2
+        self._version += 1
+        self._parent = None     # a deletion may split a component, rebuild on the next query
+
+    def batch(self):
+        """
+        Description:    Returns a context manager that collects add_edge() and remove_edge() calls and applies them
+                        with add_edges() and remove_edges() when the block ends, or drops them if it raises:
+                            with graph.batch() as batch:
+                                batch.add_edge('A', 'B')
+        Input(s):       None
+        Output(s):      a context manager yielding an EdgeBatch
+        """
+
+        return edge_batch(self)
+
+    def save(self, path: str) -> None:
+        """
+        Description:    Writes the graph to a binary file: a string table of the vertex names in insertion order, and
+                        the adjacency as compressed sparse rows of vertex ids in neighbor order
+        Input(s):       path:   the file to write
+        Output(s):      None
+        """
+
+        position = [0] * len(self._names)
+        for p, i in enumerate(self._ids.values()):
+            position[i] = p
+
+        offsets = array('q', [0])
+        targets = array('i')
+        name_offsets = array('q', [0])
+        name_bytes = bytearray()
+
+        for v, i in self._ids.items():
+            targets.extend(position[j] for j in self._adj[i])
+            offsets.append(len(targets))
+            name_bytes += v.encode()
+            name_offsets.append(len(name_bytes))
+
+        sections = {'offsets': offsets, 'targets': targets, 'name_offsets': name_offsets,
+                    'name_bytes': array('B', name_bytes)}
+        write_graph_file(path, 'U', sections)
+
+    @classmethod
+    def load(cls, path: str, mmap=True):
+        """
+        Description:    Reads a graph written by save(). With mmap the adjacency arrays stay in a shared memory map of
+                        the file and each vertex's neighbors are sliced from it when read, so the graph is queryable
+                        as soon as the names are decoded and the hubs indexed. It is then frozen, its first mutation
+                        copies it into regular arrays
+        Input(s):       path:   the file to read
+                        mmap:   whether to map the file instead of reading it
+        Output(s):      an UndirectedGraph
+        """
+
+        kind, sections = read_graph_file(path, mmap)
+        if kind != 'U':
+            raise ValueError(f'{path} does not hold an UndirectedGraph')
+
+        name_offsets = sections['name_offsets']
+        name_bytes = bytes(sections['name_bytes'])
+        text = name_bytes.decode()
+        if len(text) != len(name_bytes):    # multi-byte characters, so byte offsets are not string offsets
+            text = name_bytes
+        names = [text[lo:hi] for lo, hi in zip(name_offsets, name_offsets[1:])]
+        if text is name_bytes:
+            names = [name.decode() for name in names]
+        offsets = sections['offsets']
+        targets = sections['targets']
+
+        graph = cls()
+        graph._names = names
+        graph._ids = dict(zip(names, range(len(names))))
+        graph._frozen = not isinstance(targets, array)
+        if graph._frozen:
+            graph._adj = PackedRows(offsets, targets)
+        else:
+            graph._adj = [targets[offsets[i]:offsets[i + 1]] for i in range(len(names))]
+        graph._hubs = {i: _positions(graph._adj[i]) for i in range(len(names))
+                       if offsets[i + 1] - offsets[i] > HUB_DEGREE}
+        graph._edge_count = len(targets) // 2
+        graph._parent = None
+        return graph
+
+    @locked
+    def snapshot(self):
+        """
+        Description:    Returns a read-only view of the graph as it is now, in O(1). The view shares every structure
+                        with this graph, and this graph copies them on its next mutation (copy on write): the
+                        containers first, O(V), and then each vertex's neighbors when it first changes them. So any
+                        number of threads can query the view while one thread keeps modifying the graph
+        Input(s):       None
+        Output(s):      an UndirectedSnapshot, whose mutating methods raise TypeError
+        """
+
+        self._shared = True
+        view = UndirectedSnapshot.__new__(UndirectedSnapshot)
+        view._ids = self._ids
+        view._names = self._names
+        view._adj = self._adj
+        view._hubs = self._hubs
+        view._free = self._free
+        view._frozen = self._frozen
+        view._shared = False
+        view._owned = None
+        view._version = self._version
+        view._cache = None
+        view._instrumentation = None
+        view._counters = None
+        view._edge_index = self._edge_index
+        view._edge_count = self._edge_count
+        view._sorted = self._sorted
+        view._parent = self._parent
+        view._size = self._size
+        view._component_count = self._component_count
+        view._lock = RLock()
+        return view
+
+    def _writable(self) -> None:
+        """
+        Description:    Copies a frozen, memory mapped adjacency list into regular arrays, so the graph can be modified,
+                        and copies the containers snapshots share with it
+        Input(s):       None
+        Output(s):      None
+        """
+
+        if self._shared:
+            self._ids = dict(self._ids)
+            self._names = self._names[:]
+            self._adj = list(self._adj)
+            self._hubs = dict(self._hubs)
+            self._free = self._free[:]
+            self._sorted = dict(self._sorted)
+            if self._parent is not None:
+                self._parent = self._parent[:]
+                self._size = self._size[:]
+            self._owned = set()
+            self._shared = False
+
+        if self._frozen:
+            self._adj = [array('i', neighbors) for neighbors in self._adj]
+            if self._owned is not None:     # the hub indexes are shared too, their positions still hold
+                self._hubs = {i: dict(hub) for i, hub in self._hubs.items()}
+            self._frozen = False
+            self._owned = None      # every array is a fresh copy
+
+    def _own(self, i: int):
+        """
+        Description:    Copies vertex i's neighbor array and hub index, which snapshots may still be reading, so they
+                        can be modified
+        Input(s):       i:          a vertex id
+        Output(s):      neighbors:  the copied array
+        """
+
+        self._adj[i] = neighbors = array('i', self._adj[i])
+        hub = self._hubs.get(i)
+        if hub is not None:
+            self._hubs[i] = dict(hub)
+        self._owned.add(i)
+        return neighbors
+
+    def _intern(self, v: str) -> int:
+        """
+        Description:    Returns the id of vertex v, adding it without any edges if it does not exist yet. The ids of
+                        removed vertices are handed out again before new ones
+        Input(s):       v:  a vertex name
+        Output(s):      i:  its id
+        """
+
+        i = self._ids.get(v)
+        if i is not None:
+            return i
+
+        if self._free:
+            i = self._free.pop()
+            self._names[i] = v
+            self._adj[i] = array('i')
+        else:
+            i = len(self._names)
+            self._names.append(v)
+            self._adj.append(array('i'))
+        self._ids[v] = i
+
+        if self._parent is not None:
+            if i == len(self._parent):
+                self._parent.append(i)
+                self._size.append(1)
+            else:
+                self._parent[i] = i
+                self._size[i] = 1
+            self._component_count += 1
+        return i
+
+    def _release(self, i: int) -> None:
+        """
+        Description:    Frees the id of a vertex that was already taken out of _ids, so it can be reused
+        Input(s):       i:  the vertex id
+        Output(s):      None
+        """
+
+        self._names[i] = None
+        self._adj[i] = None
+        self._hubs.pop(i, None)
+        self._free.append(i)
+
+    def _adjacent(self, i: int, j: int) -> bool:
+        """
+        Description:    Determines if there is an edge between two vertex ids, scanning the shorter neighbor array or
+                        looking it up in a hub's index
+        Input(s):       i:  a vertex id
+                        j:  a vertex id
+        Output(s):      True if the vertices are neighbors
+        """
+
+        adj = self._adj
+        if len(adj[i]) > len(adj[j]):
+            i, j = j, i
+
+        hub = self._hubs.get(i)
+        if hub is not None:
+            return j in hub
+        return j in adj[i]
+
+    def _attach(self, i: int, j: int) -> None:
+        """
+        Description:    Appends j to the neighbors of i, indexing i's neighbors once it becomes a hub
+        Input(s):       i:  a vertex id
+                        j:  the new neighbor's id
+        Output(s):      None
+        """
+
+        neighbors = self._adj[i] if self._owned is None or i in self._owned else self._own(i)
+        hub = self._hubs.get(i)
+        if hub is not None:
+            hub[j] = len(neighbors)
+        neighbors.append(j)
+        if hub is None and len(neighbors) > HUB_DEGREE:
+            self._hubs[i] = _positions(neighbors)
+
+    def _detach(self, i: int, j: int) -> None:
+        """
+        Description:    Removes j from the neighbors of i. Other vertices scan their short array and keep the order of
+                        the rest, a hub finds j's position in its index and moves its last neighbor there, so it costs
+                        O(1) however many neighbors the hub has. The index is dropped once the hub falls well below
+                        HUB_DEGREE, so a vertex hovering around the threshold is not re-indexed often
+        Input(s):       i:  a vertex id
+                        j:  the id of the neighbor to remove
+        Output(s):      None
+        """
+
+        neighbors = self._adj[i] if self._owned is None or i in self._owned else self._own(i)
+        hub = self._hubs.get(i)
+        if hub is None:
+            neighbors.remove(j)
+            return
+
+        k = hub.pop(j)
+        last = neighbors.pop()
+        if last != j:
+            neighbors[k] = last
+            hub[last] = k
+        if len(neighbors) < HUB_DEGREE // 2:
+            del self._hubs[i]
+
+    def _drop(self, i: int, gone) -> None:
+        """
+        Description:    Removes a group of neighbors from vertex i in one pass over its array, keeping the order of
+                        the rest. A hub losing fewer neighbors than it has instead drops each one with _detach()
+        Input(s):       i:      a vertex id
+                        gone:   a set (or dict) of the neighbor ids to remove
+        Output(s):      None
+        """
+
+        self._sorted.pop(i, None)
+        hub = self._hubs.get(i)
+        if hub is not None and len(gone) < len(hub):
+            for j in [j for j in gone if j in hub]:
+                if i in self._hubs:
+                    self._detach(i, j)
+                else:       # the index was dropped part way, rewrite the rest in one pass
+                    self._drop(i, gone)
+                    return
+            return
+
+        neighbors = array('i', [j for j in self._adj[i] if j not in gone])
+        self._adj[i] = neighbors
+        if self._owned is not None:
+            self._owned.add(i)
+        if hub is not None:
+            if len(neighbors) < HUB_DEGREE // 2:
+                del self._hubs[i]
+            else:
+                self._hubs[i] = _positions(neighbors)
+
+    @locked
     def add_vertex(self, v: str) -> None:
         """
         Description:    Adds a new vertex to the graph. If the vertex name already exists, the method does nothing
@@ -47,9 +623,12 @@ class UndirectedGraph:
         Output(s):      None
         """
 
-        if v not in self.adj_list:
-            self.adj_list[v] = []
-        
+        self._writable()
+        if v not in self._ids:
+            self._intern(v)
+            self._version += 1
+
+    @locked
     def add_edge(self, u: str, v: str) -> None:
         """
         Description:    Adds a new edge to the graph. If either, or both of the vertices do not exist, adds a new
@@ -59,21 +638,30 @@ class UndirectedGraph:
         Output(s):      None
         """
 
+        self._writable()
         if u == v:
             return
 
-        if u not in self.adj_list:
+        if u not in self._ids:
             self.add_vertex(u)
-        if v not in self.adj_list:
+        if v not in self._ids:
             self.add_vertex(v)
 
-        if v in self.adj_list[u] and u in self.adj_list[v]:
+        i, j = self._ids[u], self._ids[v]
+        if self._adjacent(i, j):
             return
 
         else:
-            self.adj_list[u].append(v)
-            self.adj_list[v].append(u)
-
+            self._attach(i, j)
+            self._attach(j, i)
+            self._edge_count += 1
+            self._version += 1
+            self._sorted.pop(i, None)
+            self._sorted.pop(j, None)
+            if self._parent is not None:
+                self._union(i, j)
+
+    @locked
     def remove_edge(self, v: str, u: str) -> None:
         """
         Description:    Removes the edge between V and U. If either or both do not exist, or if there is not edge,
@@ -83,29 +671,86 @@ class UndirectedGraph:
         Output(s):      None
         """
 
-        if v not in self.adj_list or u not in self.adj_list:
+        self._writable()
+        i, j = self._ids.get(v), self._ids.get(u)
+        if i is None or j is None:
             return
 
-        if u in self.adj_list[v]:
-            self.adj_list[v].remove(u)
-        if v in self.adj_list[u]:
-            self.adj_list[u].remove(v)
+        if not self._adjacent(i, j):
+            return
+
+        self._detach(i, j)
+        self._detach(j, i)
+        self._edge_count -= 1
+        self._version += 1
+        self._sorted.pop(i, None)
+        self._sorted.pop(j, None)
+        self._parent = None     # a deletion may split a component, rebuild on the next query
 
+    @locked
     def remove_vertex(self, v: str) -> None:
         """
-        Description:    Removes the given vertex and all edges incident to it
+        Description:    Removes the given vertex and all edges incident to it. Only the vertex's own neighbors are
+                        visited, so this is O(deg(v)) plus the cost of dropping v from each neighbor's array
         Input(s):       v:  the vertex to remove
         Output(s):      None
         """
 
-        if v not in self.adj_list:
+        self._writable()
+        i = self._ids.pop(v, None)
+        if i is None:
             return
 
-        del self.adj_list[v]
+        neighbors = self._adj[i]
+        self._edge_count -= len(neighbors)
+        self._version += 1
+        self._sorted.pop(i, None)
+        for j in neighbors:
+            self._detach(j, i)
+            self._sorted.pop(j, None)
 
-        for i in self.adj_list:
-            if v in self.adj_list[i]:
-                self.adj_list[i].remove(v)
+        if self._parent is not None and len(neighbors) == 0 and self._parent[i] == i and self._size[i] == 1:
+            self._component_count -= 1     # an isolated vertex is a component of its own
+        else:
+            self._parent = None
+        self._release(i)
+
+    @locked
+    def remove_vertices(self, vertices) -> None:
+        """
+        Description:    Removes every given vertex and all edges incident to them in a single pass, rewriting each
+                        affected neighbor array once. Vertices that do not exist are skipped
+        Input(s):       vertices:   an iterable of vertices to remove
+        Output(s):      None
+        """
+
+        self._writable()
+        removed = dict()
+        for v in vertices:
+            i = self._ids.pop(v, None)
+            if i is not None:
+                removed[i] = self._adj[i]
+                self._sorted.pop(i, None)
+                self._parent = None
+                self._version += 1
+
+        inner = 0
+        touched = set()
+        for i, neighbors in removed.items():
+            for j in neighbors:
+                if j not in removed:
+                    touched.add(j)
+                    self._edge_count -= 1
+                else:
+                    inner += 1
+
+        self._edge_count -= inner // 2     # edges between two removed vertices were seen from both ends
+
+        for j in touched:
+            self._drop(j, removed)
+
+        for i in removed:
+            self._release(i)
 
     def get_vertices(self) -> []:
         """
@@ -115,31 +760,65 @@ class UndirectedGraph:
         """
 
         vertices = []
-        for i in self.adj_list:
+        for i in self._ids:
             vertices.append(i)
 
         return vertices
 
+    def _positions(self) -> []:
+        """
+        Description:    Returns each vertex id's position in the vertex order, indexed by id
+        Input(s):       None
+        Output(s):      position:   a list where position[i] is the index of vertex i in get_vertices()
+        """
+
+        position = [0] * len(self._names)
+        for p, i in enumerate(self._ids.values()):
+            position[i] = p
+        return position
+
     def get_edges(self) -> []:
         """
         Description:    Returns a list of edges in the graph. Each edge is returned as a tuple of two incident vertex
-                        names
+                        names, ordered by the position of the vertices in the graph. Walks the adjacency once, O(V + E)
         Input(s):       None
         Output(s):      edges:  a list of edge tuples
         """
 
-        edges = []
+        names = self._names
+        position = self._positions()
+        buckets = [[] for _ in names]
 
-        keys = list(self.adj_list)
+        # visiting the later endpoint in vertex order fills each bucket already sorted by that endpoint
+        for j in self._ids.values():
+            p = position[j]
+            for i in self._adj[j]:
+                if position[i] < p:
+                    buckets[i].append(j)
 
-        for i in range(len(self.adj_list)):
-            key_i = keys[i]
-            for j in range(i + 1, len(self.adj_list)):
-                key_j = keys[j]
-                if key_i in self.adj_list[key_j]:
-                    edges.append( (key_i, key_j))
+        edges = []
+        for key_i, i in self._ids.items():
+            edges.extend((key_i, names[j]) for j in buckets[i])
         return edges
 
+    def iter_edges(self):
+        """
+        Description:    Lazily yields each edge in the graph exactly once as a tuple of two incident vertex names, in
+                        adjacency order. Nothing beyond a vertex position table is built, so it suits streaming large
+                        graphs
+        Input(s):       None
+        Output(s):      yields (u, v) edge tuples
+        """
+
+        names = self._names
+        position = self._positions()
+
+        for u, i in self._ids.items():
+            p = position[i]
+            for j in self._adj[i]:
+                if position[j] > p:
+                    yield (u, names[j])
+
     def is_valid_path(self, path: []) -> bool:
         """
         Description:    Determines if the sequence of given vertices represent a valid path in the graph
@@ -148,23 +827,94 @@ class UndirectedGraph:
                         False:  if the given path is invalid
         """
 
-        if len(self.adj_list) == 0:
+        ids = self._ids
+        if len(ids) == 0:
             return False
 
         if len(path) == 1:
-            if path[0] not in self.adj_list:
+            if path[0] not in ids:
                 return False
             else:
                 return True
 
         for i in range(len(path) - 1):
-            if path[i] not in self.adj_list:
+            u, v = ids.get(path[i]), ids.get(path[i + 1])
+            if u is None:
                 return False
-            if path[i+1] not in self.adj_list[path[i]]:
+            if v is None or not self._adjacent(u, v):
                 return False
 
         return True
 
+    def validate_paths(self, paths, pad=''):
+        """
+        Description:    Determines which of many paths are valid, checking all of their steps in one batch. Names are
+                        turned into ids in one pass, and every step is looked up by binary search in the sorted codes
+                        of the edges, which are built once per version of the graph
+        Input(s):       paths:  a 2-D NumPy array of vertex names with one path per row, each ending at its first pad
+                                entry, or an iterable of lists of vertices
+                        pad:    the padding value of a 2-D array
+        Output(s):      valid:  a boolean NumPy array with one entry per path, as is_valid_path() would return. A list
+                                of bools when numpy is not installed
+        """
+
+        if np is None:
+            return [self.is_valid_path(list(path)) for path in paths]
+
+        flat, lengths = flatten_paths(paths, pad, None)
+        if len(self._ids) == 0:
+            return np.zeros(len(lengths), dtype=bool)
+
+        lookup = self._ids.get
+        ids = np.fromiter((lookup(v, -1) for v in flat.tolist()), dtype=np.int64, count=len(flat))
+
+        return validate_flat(ids, lengths, len(self._adj), self._edge_lookup())
+
+    def _edge_lookup(self):
+        """
+        Description:    Returns the vectorized edge test validate_paths() uses, reusing the one built for the current
+                        version
+        Input(s):       None
+        Output(s):      a function (srcs, dsts) -> boolean array of whether each pair of ids is an edge
+        """
+
+        if self._edge_index is not None and self._edge_index[0] == self._version:
+            return self._edge_index[1]
+
+        adj = self._adj
+        degrees = np.fromiter((0 if neighbors is None else len(neighbors) for neighbors in adj), dtype=np.intp,
+                              count=len(adj))
+        targets = np.frombuffer(b''.join(bytes(neighbors) for neighbors in adj if neighbors), dtype=np.int32)
+        has_edge = edge_lookup(np.repeat(np.arange(len(adj)), degrees), targets, len(adj))
+
+        self._edge_index = (self._version, has_edge)
+        return has_edge
+
+    def sorted_neighbors(self, v: str) -> []:
+        """
+        Description:    Returns the neighbors of v in ascending order. The sorted order is cached per vertex and only
+                        rebuilt after an edge incident to v changes, so repeated traversals do not re-sort
+        Input(s):       v:          the vertex whose neighbors are wanted, it must exist in the graph
+        Output(s):      neighbors:  a sorted list of v's neighbors
+        """
+
+        names = self._names
+        return [names[j] for j in self._sorted_ids(self._ids[v])]
+
+    def _sorted_ids(self, i: int) -> []:
+        """
+        Description:    Returns the ids of vertex i's neighbors in ascending order of their names, cached per vertex
+        Input(s):       i:          a vertex id
+        Output(s):      neighbors:  a list of ids, shared with the cache so do not modify it
+        """
+
+        neighbors = self._sorted.get(i)
+        if neighbors is None:
+            neighbors = sorted(self._adj[i], key=self._names.__getitem__)
+            self._sorted[i] = neighbors
+        return neighbors
+
+    @cached_query
     def dfs(self, v_start, v_end=None) -> []:
         """
         Description:    Performs a depth first search in the graph and returns a list of the vertices visited, in the
@@ -174,39 +924,67 @@ class UndirectedGraph:
         Output(s):      visited:    a list of the vertices that were visited
         """
 
-        visited= []
-
-        if v_start not in self.adj_list:
-            return visited
+        visited = []
 
-        if v_end != None and v_end not in self.adj_list:
+        if v_end != None and v_end not in self._ids:
             v_end = None
 
-        for item in self.adj_list:
-            self.adj_list[item].sort()
+        for vertex in self.iter_dfs(v_start):
+            visited.append(vertex)
+            if vertex == v_end:
+                break
 
-        self.dfs_helper(visited, v_start, v_end)
         return visited
 
-    def dfs_helper(self, visited, vertex, v_end):
+    def iter_dfs(self, v_start, max_depth=None, details=False):
         """
-        Description:    A helper function to traverse the graph recursively
-        Input(s):       visited:    to keep track of what we have visited
-                        vertex:     to keep track of what vertex to check for
-                        v_end:      where do we end
-        Output(s):      None
+        Description:    Lazily yields the vertices of a depth first search in the same order as dfs(). Uses an
+                        explicit stack of neighbor iterators over vertex ids, and no further work is done once the
+                        caller stops consuming it. The graph must not be modified while the generator is in use
+        Input(s):       v_start:    where to start the search, nothing is yielded if it does not exist
+                        max_depth:  if provided, vertices deeper than this in the search tree are not expanded
+                        details:    if True, yields (vertex, parent, depth) tuples instead of bare vertices
+        Output(s):      yields the vertices visited, in the order that they were visited
         """
 
-        if vertex not in visited:
-            visited.append(vertex)
-            if v_end != None and vertex == v_end:
-                return True
-
-            for edge in self.adj_list[vertex]:
-                exit = self.dfs_helper(visited, edge, v_end)
-                if exit:
-                    return True # need to exit recursion
+        start = self._ids.get(v_start)
+        if start is None:
+            return
 
+        names = self._names
+        seen = bytearray(len(names))
+        seen[start] = 1
+        stack = []
+        push, sorted_ids = stack.append, self._sorted_ids
+        counters = self._counters
+        if counters is not None:    # instrumented, count the work as it is done
+            push = counted_calls(push, counters, 'stack_pushes')
+            sorted_ids = counted_items(sorted_ids, counters, 'edges_scanned')
+
+        try:
+            yield (names[start], None, 0) if details else names[start]
+
+            if max_depth is not None and max_depth <= 0:
+                return
+
+            push((start, iter(sorted_ids(start))))
+            while stack:
+                parent, neighbors = stack[-1]
+                for neighbor in neighbors:
+                    if not seen[neighbor]:
+                        seen[neighbor] = 1
+                        depth = len(stack)
+                        yield (names[neighbor], names[parent], depth) if details else names[neighbor]
+                        if max_depth is None or depth < max_depth:
+                            push((neighbor, iter(sorted_ids(neighbor))))
+                        break
+                else:
+                    stack.pop()     # every neighbor seen, backtrack
+        finally:
+            if counters is not None:
+                add_count(counters, 'vertices_visited', seen.count(1))
+
+    @cached_query
     def bfs(self, v_start, v_end=None) -> []:
         """
         Description:    Performs a breadth first search in the graph and returns a list of indices visited, in the
@@ -217,104 +995,237 @@ class UndirectedGraph:
         """
 
         visited = []
-        queue = []
-
-        if v_start not in self.adj_list:
-            return visited
 
-        if v_end != None and v_end not in self.adj_list:
+        if v_end != None and v_end not in self._ids:
             v_end = None
 
-        for item in self.adj_list:
-            self.adj_list[item].sort()
+        for vertex in self.iter_bfs(v_start):
+            visited.append(vertex)
+            if vertex == v_end:
+                break
 
-        visited.append(v_start)
-        queue.append(v_start)
+        return visited
 
-        if v_end == v_start:
-            return visited
+    def iter_bfs(self, v_start, max_depth=None, details=False):
+        """
+        Description:    Lazily yields the vertices of a breadth first search in the same order as bfs(), so callers
+                        can stop after the first k vertices or on any condition without finishing the search. The
+                        graph must not be modified while the generator is in use
+        Input(s):       v_start:    where to start the search, nothing is yielded if it does not exist
+                        max_depth:  if provided, vertices more than this many edges from v_start are not yielded
+                        details:    if True, yields (vertex, parent, depth) tuples instead of bare vertices
+        Output(s):      yields the vertices visited, in the order that they were visited
+        """
 
-        while queue:
-            next = queue.pop(0)
+        start = self._ids.get(v_start)
+        if start is None:
+            return
 
-            for vertex in self.adj_list[next]:
-                if vertex not in visited:
-                    visited.append(vertex)
-                    queue.append(vertex)
-                if vertex == v_end:
-                    break
+        names = self._names
+        seen = bytearray(len(names))
+        seen[start] = 1
+        queue = deque()
+        push, sorted_ids = queue.append, self._sorted_ids
+        counters = self._counters
+        if counters is not None:    # instrumented, count the work as it is done
+            push = counted_calls(push, counters, 'queue_pushes')
+            sorted_ids = counted_items(sorted_ids, counters, 'edges_scanned')
+
+        try:
+            yield (names[start], None, 0) if details else names[start]
+
+            push((start, 0))
+            while queue:
+                next, depth = queue.popleft()
+                if max_depth is not None and depth >= max_depth:
+                    continue
+
+                for vertex in sorted_ids(next):
+                    if not seen[vertex]:
+                        seen[vertex] = 1
+                        yield (names[vertex], names[next], depth + 1) if details else names[vertex]
+                        push((vertex, depth + 1))
+        finally:
+            if counters is not None:
+                add_count(counters, 'vertices_visited', seen.count(1))
+
+    @cached_query
+    def shortest_hop_path(self, u: str, v: str) -> []:
+        """
+        Description:    Returns a path with the fewest edges between two vertices, searching from both ends at once
+                        and meeting in the middle. On large graphs with short paths this visits far fewer vertices
+                        than bfs(u, v), which only expands outward from u
+        Input(s):       u:      the start of the path
+                        v:      the end of the path
+        Output(s):      path:   the vertices from u to v, or an empty list if either does not exist or they are not
+                                connected
+        """
 
-            if vertex == v_end:
-                break
+        i, j = self._ids.get(u), self._ids.get(v)
+        if i is None or j is None:
+            return []
 
-        return visited
+        neighbors = self._adj.__getitem__
+        names = self._names
+        return [names[k] for k in bidirectional_bfs(i, j, neighbors, neighbors)]
 
     def count_connected_components(self):
         """
-        Description:    Returns the number of connected components in the graph
+        Description:    Returns the number of connected components in the graph. The count is kept up to date by a
+                        union-find forest as vertices and edges are added, and is only recomputed after a deletion
         Input(s):       None
         Output(s):      connected:  the number of connected components
         """
 
-        visited = []
-        count = 0
+        self._build_components()
+        return self._component_count
+
+    def same_component(self, u: str, v: str) -> bool:
+        """
+        Description:    Determines if two vertices are in the same connected component
+        Input(s):       u:      a vertex in the graph
+                        v:      a vertex in the graph
+        Output(s):      True:   if there is a path between u and v
+                        False:  if there is not, or if either vertex does not exist
+        """
+
+        i, j = self._ids.get(u), self._ids.get(v)
+        if i is None or j is None:
+            return False
+
+        self._build_components()
+        return self._find(i) == self._find(j)
+
+    def _build_components(self):
+        """
+        Description:    Rebuilds the union-find forest over the vertex ids if a deletion invalidated it
+        Input(s):       None
+        Output(s):      None
+        """
+
+        if self._parent is not None:
+            return
+
+        self._parent = list(range(len(self._names)))
+        self._size = [1] * len(self._names)
+        self._component_count = len(self._ids)
 
-        keys = list(self.adj_list)
+        for i in self._ids.values():
+            for j in self._adj[i]:
+                if i < j:
+                    self._union(i, j)
 
-        count_dict = dict()
-        for i in range(len(keys)):
-            count_dict[keys[i]] = False
+    def _find(self, i: int) -> int:
+        """
+        Description:    Returns the root of i's tree in the union-find forest, compressing the path along the way
+        Input(s):       i:      a vertex id
+        Output(s):      root:   the representative of i's component
+        """
+
+        parent = self._parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+
+        return root
+
+    def _union(self, i: int, j: int) -> bool:
+        """
+        Description:    Merges the components of i and j, hanging the smaller tree under the larger one
+        Input(s):       i:      a vertex id
+                        j:      a vertex id
+        Output(s):      True:   if two components were merged
+                        False:  if i and j were already in the same component
+        """
 
-        for i in range(len(keys)):
-            if count_dict[keys[i]] is False:
-                count += 1
-                visited = self.dfs(keys[i])
-                for j in visited:
-                    if count_dict[j] is False:
-                        count_dict[j] = True
-        return count
+        root_i = self._find(i)
+        root_j = self._find(j)
+        if root_i == root_j:
+            return False
+
+        if self._size[root_i] < self._size[root_j]:
+            root_i, root_j = root_j, root_i
+        self._parent[root_j] = root_i
+        self._size[root_i] += self._size[root_j]
+        self._component_count -= 1
+        return True
 
     def has_cycle(self):
         """
-        Description:    Determines if the graph has a cycle
+        Description:    Determines if the graph has a cycle. A forest has exactly V - C edges for C components, so
+                        any extra edge closes a cycle. O(1) while the component forest is current, and a single
+                        O(V + E) pass to rebuild it after a deletion
         Input(s):       None
         Output(s):      True:   if the graph has a cycle
                         False:  if the graph does not have a cycle
         """
 
-        keys = list(self.adj_list)
-
-        for i in keys:
-            if self.cycle_helper(i):
-                return True
-
-        return False
+        return self._edge_count > len(self._ids) - self.count_connected_components()
 
-    def cycle_helper(self, vertex):
+    def closes_cycle(self, u: str, v: str) -> bool:
         """
-        Description:    Does a breadth first search to determine if the given vertex has a cycle
-        Input(s):       vertex: the current node to study
-        Output(s):      True:   if cycle was found
-                        False:  if cycle was not found
+        Description:    Determines, before calling add_edge(u, v), whether that edge would close a cycle, i.e. whether
+                        it would join two vertices that are already connected
+        Input(s):       u:      a vertex to connect
+                        v:      a vertex to connect
+        Output(s):      True:   if adding the edge would create a new cycle
+                        False:  if it would not, including when the edge already exists or u == v
         """
-        colors = {node: "red" for node in self.adj_list}    # mark unvisited nodes as red
-        colors[vertex] = "black"        # visited
 
-        visited = [(None, vertex)]      # we will store the edge as a list of tuples
+        i, j = self._ids.get(u), self._ids.get(v)
+        if u == v or i is None or j is None or self._adjacent(i, j):
+            return False
+
+        self._build_components()
+        return self._find(i) == self._find(j)
 
-        while visited:
-            (prev, next) = visited.pop()
-            for neighbor in self.adj_list[next]:
-                if neighbor == prev:
-                    pass    # don't go back the way we just came
-                elif colors[neighbor] == "black":
-                    return True     # found a cycle
-                else:   # haven't visited, keep going
-                    colors[neighbor] = "black"
-                    visited.append( (next, neighbor) )
 
-        return False    # no cycles here
-        # this took forever to determine how to track the parent and not go from neighbor back to parent vertex
+class UndirectedSnapshot(UndirectedGraph):
+    """
+    Class for the read-only views returned by UndirectedGraph.snapshot()
+    - answers every query of the graph it was taken from, as that graph was at the time
+    - never changes after it is taken, so threads can query it without a lock
+    - adding or removing vertices or edges raises TypeError
+    - does not inherit the graph's query cache or instrumentation
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('an UndirectedGraph snapshot cannot be modified')
+
+    add_vertex = add_edge = add_edges = batch = _writable = _read_only
+    remove_edge = remove_edges = remove_vertex = remove_vertices = _read_only
+
+    def snapshot(self):
+        return self     # already immutable
+
+    def _build_components(self):
+        with self._lock:    # the first reader to need the forest builds it while the others wait
+            super()._build_components()
+
+
+def _positions(neighbors) -> dict:
+    """
+    Description:    Builds a hub's index of its neighbor array
+    Input(s):       neighbors:  an array of neighbor ids
+    Output(s):      a dict from each neighbor id to its position in the array
+    """
+
+    return dict(zip(neighbors, range(len(neighbors))))
+
+def _edge_pairs(rows):
+    """
+    Description:    Converts the field lists of an edge list file to (u, v) pairs
+    Input(s):       rows:   an iterable of field lists, as from iter_edge_rows()
+    Output(s):      yields (u, v) pairs, fields after the second are ignored
+    """
+
+    for fields in rows:
+        if len(fields) < 2:
+            raise ValueError('every line needs two vertices')
+        yield fields[0], fields[1]
 
 if __name__ == '__main__':
 